@@ -1,8 +1,8 @@
-const { Queue, Worker, Job } = require('bullmq');
+const { Queue, Worker, Job, DelayedError } = require('bullmq');
 const { db } = require('./db');
-const axios = require('axios');
 const IORedis = require('ioredis');
 const logger = require('./logger');
+const { postWithSession, PYTHON_SERVICE_URL, PYTHON_SERVICE_SOCKET } = require('./utils/pythonClient');
 
 // Helper function to check if all jobs are complete and update project status
 const checkAndUpdateProjectStatus = async (run_id, project_id) => {
@@ -131,11 +131,25 @@ redisClient.on('connect', () => {
   });
 });
 
+// How many times a job may be re-delayed because the Python service answered 429
+const MAX_ADMISSION_DELAYS = parseInt(process.env.BACKEND_MAX_ADMISSION_DELAYS || '20', 10);
+
+// Python service rejected the request at admission (overloaded), not a send failure
+const isAdmissionRejected = (error) => !!(error.response && error.response.status === 429);
+
+const getRetryAfterMs = (error) => {
+  const header = error.response.headers && error.response.headers['retry-after'];
+  const body = error.response.data && error.response.data.retry_after;
+  const seconds = parseFloat(header || body);
+  // Jitter so delayed jobs do not come back as one burst
+  return (Number.isFinite(seconds) && seconds > 0 ? seconds : 1) * 1000 + Math.floor(Math.random() * 1000);
+};
+
 // Create queues for different types of jobs
 const sendQueue = new Queue('send message', { connection: redisConnection });
 
 // Initialize the worker to process jobs
-const worker = new Worker('send message', async (job) => {
+const worker = new Worker('send message', async (job, token) => {
   const { session_string, chat_id, type, file_path, caption, reply_to_message_id, run_id } = job.data;
   
   logger.info('Worker processing job', {
@@ -181,28 +195,24 @@ const worker = new Worker('send message', async (job) => {
     lockValue
   });
   
+  const jobStartedAt = Date.now();
   try {
     // Call the Python service to send the message
-    const PYTHON_SERVICE_URL = process.env.PYTHON_SERVICE_URL || 'http://localhost:8000';
     logger.debug('Calling Python service to send message', {
       operation: 'send_message',
       jobId: job.id,
-      pythonServiceUrl: PYTHON_SERVICE_URL,
+      pythonServiceUrl: PYTHON_SERVICE_SOCKET ? `unix:${PYTHON_SERVICE_SOCKET}` : PYTHON_SERVICE_URL,
       endpoint: '/send_message',
       chatId: chat_id,
       type
     });
-    const response = await axios.post(`${PYTHON_SERVICE_URL}/send_message`, {
-      session_string,
+    const response = await postWithSession('/send_message', session_string, {
+      job_id: job.id,
       chat_id,
       message_type: type,
       file_path,
       caption,
       reply_to_message_id
-    }, {
-      headers: {
-        'x-internal-secret': process.env.INTERNAL_SECRET
-      }
     });
     
     // Update the session's last_used_at
@@ -265,6 +275,8 @@ const worker = new Worker('send message', async (job) => {
       jobId: job.id,
       runId: run_id,
       chatId: chat_id,
+      durationMs: Date.now() - jobStartedAt,
+      skipped: !!(response.data && response.data.skipped),
       event: 'job_completed'
     });
     
@@ -283,6 +295,37 @@ const worker = new Worker('send message', async (job) => {
     
     return response.data;
   } catch (error) {
+    // Overload is not a failure: wait for Retry-After without using an attempt or counting an error
+    const admissionDelays = job.data.admission_delays || 0;
+    if (isAdmissionRejected(error) && admissionDelays < MAX_ADMISSION_DELAYS) {
+      const retryAfterMs = getRetryAfterMs(error);
+      await job.updateData({ ...job.data, admission_delays: admissionDelays + 1 });
+      await job.moveToDelayed(Date.now() + retryAfterMs, token);
+      
+      logger.info('Python service busy, job delayed', {
+        operation: 'process_job',
+        jobId: job.id,
+        runId: run_id,
+        chatId: chat_id,
+        retryAfterMs,
+        admissionDelays: admissionDelays + 1,
+        event: 'job_admission_delayed'
+      });
+      
+      throw new DelayedError();
+    }
+    
+    logger.warn('Worker job attempt failed', {
+      operation: 'process_job',
+      jobId: job.id,
+      runId: run_id,
+      chatId: chat_id,
+      durationMs: Date.now() - jobStartedAt,
+      statusCode: error.response ? error.response.status : undefined,
+      error: (error.response && error.response.data && error.response.data.error) || error.message,
+      event: 'job_attempt_failed'
+    });
+    
     // Update the process run stats for failure (error count only)
     // Use manual stats update for consistency
     try {
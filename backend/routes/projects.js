@@ -2,6 +2,7 @@ const express = require('express');
 const { v4: uuidv4 } = require('uuid');
 const { db } = require('../db');
 const { addSendMessageJob, cleanupProjectJobs } = require('../queue');
+const { planAssignments } = require('../utils/pythonClient');
 const logger = require('../logger');
 const router = express.Router();
 
@@ -169,7 +170,37 @@ router.post('/:id/run', async (req, res) => {
                 return res.status(400).json({ success: false, error: 'No messages found for this project. Please add at least one file (text or media).' });
               }
               
-              const sessionId = sessions[0].session_id; // Always use first (and only) session
+              const sessionId = sessions[0].session_id; // Default: first session
+              
+              // With several sessions, keep each channel on the same account across runs
+              let channelSessions = {};
+              if (sessions.length > 1) {
+                try {
+                  const sessionIds = sessions.map(s => s.session_id);
+                  const sessionRows = await new Promise((resolve, reject) => {
+                    db.all(
+                      `SELECT id, session_string FROM sessions WHERE id IN (${sessionIds.map(() => '?').join(',')})`,
+                      sessionIds,
+                      (rowsErr, rows) => rowsErr ? reject(rowsErr) : resolve(rows)
+                    );
+                  });
+                  channelSessions = await planAssignments(
+                    sessionRows.filter(s => s.session_string),
+                    targets.map(t => t.channel_id)
+                  );
+                  logger.info('[Project Run] Planned channel assignments', {
+                    operation: 'project_run',
+                    sessionsCount: sessions.length,
+                    assignedChannels: Object.keys(channelSessions).length
+                  });
+                } catch (planErr) {
+                  logger.warn('[Project Run] Assignment planning failed, using first session', {
+                    operation: 'project_run',
+                    error: planErr.message
+                  });
+                  channelSessions = {};
+                }
+              }
               
               // Determine message structure: text only, media only, or media + caption
               let textMessage = null;
@@ -193,6 +224,7 @@ router.post('/:id/run', async (req, res) => {
               });
               
               for (const target of targets) {
+                const targetSessionId = channelSessions[String(target.channel_id)] || sessionId;
                 try {
                   logger.info('[Project Run] Processing target', {
                     operation: 'project_run',
@@ -206,7 +238,7 @@ router.post('/:id/run', async (req, res) => {
                       runId, 
                       id, 
                       target.channel_id, 
-                      sessionId, 
+                      targetSessionId, 
                       mediaMessage.id,
                       { caption_message_id: textMessage.id, job_index: jobIndex }
                     );
@@ -223,7 +255,7 @@ router.post('/:id/run', async (req, res) => {
                       runId, 
                       id, 
                       target.channel_id, 
-                      sessionId, 
+                      targetSessionId, 
                       mediaMessage.id,
                       { job_index: jobIndex }
                     );
@@ -240,7 +272,7 @@ router.post('/:id/run', async (req, res) => {
                       runId, 
                       id, 
                       target.channel_id, 
-                      sessionId, 
+                      targetSessionId, 
                       textMessage.id,
                       { job_index: jobIndex }
                     );
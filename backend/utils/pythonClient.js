@@ -0,0 +1,116 @@
+const http = require('http');
+const axios = require('axios');
+const logger = require('../logger');
+
+const PYTHON_SERVICE_URL = process.env.PYTHON_SERVICE_URL || 'http://localhost:8000';
+const PYTHON_SERVICE_SOCKET = process.env.PYTHON_SERVICE_SOCKET;
+
+// Reuse connections instead of opening a new loopback TCP connection per job
+const keepAliveAgent = new http.Agent({ keepAlive: true, maxSockets: 32 });
+
+const client = axios.create({
+  // With a Unix socket the host part is ignored, only the path matters
+  baseURL: PYTHON_SERVICE_SOCKET ? 'http://localhost' : PYTHON_SERVICE_URL,
+  socketPath: PYTHON_SERVICE_SOCKET || undefined,
+  httpAgent: keepAliveAgent,
+  headers: {
+    'x-internal-secret': process.env.INTERNAL_SECRET
+  }
+});
+
+// session_string -> handle returned by the Python service
+const sessionHandles = new Map();
+
+const isUnknownHandle = (error) =>
+  error.response &&
+  error.response.status === 404 &&
+  error.response.data &&
+  error.response.data.error_code === 'unknown_session_handle';
+
+/**
+ * Register a session string with the Python service (cached per process)
+ * @param {string} sessionString - Full Pyrogram session string
+ * @param {boolean} force - Re-register even if a handle is cached
+ * @returns {Promise<string>} - Session handle
+ */
+const getSessionHandle = async (sessionString, force = false) => {
+  if (!force && sessionHandles.has(sessionString)) {
+    return sessionHandles.get(sessionString);
+  }
+
+  const response = await client.post('/sessions/register', { session_string: sessionString });
+  const handle = response.data.session_handle;
+  sessionHandles.set(sessionString, handle);
+
+  logger.debug('Registered session with Python service', {
+    operation: 'register_session_handle',
+    sessionHandle: handle,
+    transport: PYTHON_SERVICE_SOCKET ? 'unix' : 'tcp'
+  });
+
+  return handle;
+};
+
+/**
+ * POST to the Python service using a session handle instead of the session string.
+ * Re-registers once if the service no longer knows the handle (e.g. after restart).
+ * @param {string} endpoint - Python service endpoint, e.g. '/send_message'
+ * @param {string} sessionString - Full Pyrogram session string
+ * @param {Object} payload - Remaining request body
+ * @returns {Promise} - Axios response
+ */
+const postWithSession = async (endpoint, sessionString, payload = {}) => {
+  const handle = await getSessionHandle(sessionString);
+
+  try {
+    return await client.post(endpoint, { ...payload, session_handle: handle });
+  } catch (error) {
+    if (!isUnknownHandle(error)) {
+      throw error;
+    }
+
+    logger.debug('Session handle expired, re-registering', {
+      operation: 'register_session_handle',
+      endpoint,
+      sessionHandle: handle
+    });
+    const freshHandle = await getSessionHandle(sessionString, true);
+    return client.post(endpoint, { ...payload, session_handle: freshHandle });
+  }
+};
+
+/**
+ * Ask the Python service which session should handle each target channel.
+ * Assignments are sticky across runs and skip accounts that are in FloodWait.
+ * @param {Array<{id: string, session_string: string}>} sessions - Run sessions
+ * @param {Array<string>} targets - Target channel ids
+ * @returns {Promise<Object>} - Map of channel id -> session id
+ */
+const planAssignments = async (sessions, targets, force = false) => {
+  const withHandles = await Promise.all(sessions.map(async (session) => ({
+    id: session.id,
+    session_handle: await getSessionHandle(session.session_string, force)
+  })));
+
+  try {
+    const response = await client.post('/plan_assignments', {
+      sessions: withHandles,
+      targets: targets.map(String)
+    });
+    return response.data.assignments;
+  } catch (error) {
+    if (!force && isUnknownHandle(error)) {
+      return planAssignments(sessions, targets, true);
+    }
+    throw error;
+  }
+};
+
+module.exports = {
+  client,
+  getSessionHandle,
+  postWithSession,
+  planAssignments,
+  PYTHON_SERVICE_URL,
+  PYTHON_SERVICE_SOCKET
+};
@@ -0,0 +1,129 @@
+"""
+Admission Control for the Pyrogram Service
+Bounds in-flight Telegram operations globally and per session
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted in time"""
+
+    def __init__(self, reason, retry_after):
+        super().__init__(f"Service saturated ({reason}), retry after {retry_after}s")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+def session_key(session_string):
+    """Short, non-reversible key for a session string (safe to expose in metrics)"""
+    if not session_string:
+        return "anonymous"
+    return hashlib.sha256(session_string.encode('utf-8')).hexdigest()[:12]
+
+
+class AdmissionController:
+    """Global and per-session in-flight limits with a bounded wait queue"""
+
+    def __init__(self, max_inflight=32, max_per_session=2, max_queue=64, queue_timeout=10.0):
+        self.max_inflight = max_inflight
+        self.max_per_session = max_per_session
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._cond = threading.Condition()
+        self._inflight = 0
+        self._per_session = {}
+        self._waiting = 0
+        self._avg_duration = 1.0  # EWMA of operation duration in seconds
+        self._admitted_total = 0
+        self._rejected = {'queue_full': 0, 'queue_timeout': 0}
+
+    @classmethod
+    def from_env(cls):
+        """Build a controller from PYTHON_* environment variables"""
+        return cls(
+            max_inflight=int(os.getenv('PYTHON_MAX_INFLIGHT', '32')),
+            max_per_session=int(os.getenv('PYTHON_MAX_INFLIGHT_PER_SESSION', '2')),
+            max_queue=int(os.getenv('PYTHON_ADMISSION_QUEUE_SIZE', '64')),
+            queue_timeout=float(os.getenv('PYTHON_ADMISSION_QUEUE_TIMEOUT', '10')),
+        )
+
+    def _can_run(self, key):
+        return (self._inflight < self.max_inflight
+                and self._per_session.get(key, 0) < self.max_per_session)
+
+    def _take(self, key):
+        self._inflight += 1
+        self._per_session[key] = self._per_session.get(key, 0) + 1
+        self._admitted_total += 1
+
+    def _retry_after(self):
+        """Estimate seconds until a slot frees up, based on observed durations"""
+        backlog = self._waiting + 1
+        estimate = self._avg_duration * backlog / max(self.max_inflight, 1)
+        return max(1, int(math.ceil(estimate)))
+
+    def _reject(self, reason):
+        self._rejected[reason] += 1
+        return AdmissionRejected(reason, self._retry_after())
+
+    def acquire(self, key):
+        """Take a slot for `key`, waiting in the bounded queue if needed.
+
+        Returns the monotonic start time to pass back to release().
+        Raises AdmissionRejected when the queue is full or the wait times out.
+        """
+        with self._cond:
+            if not self._can_run(key):
+                if self._waiting >= self.max_queue:
+                    raise self._reject('queue_full')
+
+                deadline = time.monotonic() + self.queue_timeout
+                self._waiting += 1
+                try:
+                    while not self._can_run(key):
+                        remaining = deadline - time.monotonic()
+                        if remaining <= 0:
+                            raise self._reject('queue_timeout')
+                        self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+            self._take(key)
+            return time.monotonic()
+
+    def release(self, key, started_at=None):
+        """Return a slot and wake up waiters"""
+        with self._cond:
+            self._inflight -= 1
+            remaining = self._per_session.get(key, 1) - 1
+            if remaining > 0:
+                self._per_session[key] = remaining
+            else:
+                self._per_session.pop(key, None)
+
+            if started_at is not None:
+                duration = time.monotonic() - started_at
+                self._avg_duration = 0.8 * self._avg_duration + 0.2 * duration
+
+            self._cond.notify_all()
+
+    def stats(self):
+        """Snapshot of admission state for the metrics endpoint"""
+        with self._cond:
+            return {
+                'inflight': self._inflight,
+                'queueDepth': self._waiting,
+                'activeSessions': len(self._per_session),
+                'maxInflight': self.max_inflight,
+                'maxInflightPerSession': self.max_per_session,
+                'maxQueue': self.max_queue,
+                'queueTimeout': self.queue_timeout,
+                'avgDurationSeconds': round(self._avg_duration, 3),
+                'admittedTotal': self._admitted_total,
+                'rejectedTotal': dict(self._rejected),
+            }
@@ -0,0 +1,149 @@
+"""
+Account-to-Channel Affinity Planner
+Assigns a run's target channels to accounts with weighted rendezvous hashing,
+so the same account keeps getting the same channels across runs (and reuses
+its peer cache, history cursors and duplicate ledger for them). Weights come
+from each account's observed health and FloodWait budget, quantized into a few
+bands so an occasional failed send does not move channels. When an account
+drops out mostly only its own channels move: with no account at its capacity
+cap nothing else moves, but a survivor pushed over its cap by the extra
+channels hands a few of its own channels on to the next-ranked account.
+"""
+import hashlib
+import math
+import os
+import threading
+import time
+
+
+class AccountHealth:
+    """Per-account success rate (EWMA) and FloodWait usage, keyed by session key"""
+
+    # (minimum health, weight): health = success rate x FloodWait budget left.
+    # From full health it takes several failures in a row to drop a band.
+    WEIGHT_BANDS = ((0.6, 1.0), (0.3, 0.5), (0.0, 0.25))
+
+    def __init__(self, flood_budget_seconds=600, flood_window_seconds=3600, exclude_wait_seconds=60, alpha=0.2):
+        self.flood_budget_seconds = flood_budget_seconds
+        self.flood_window_seconds = flood_window_seconds
+        self.exclude_wait_seconds = exclude_wait_seconds
+        self.alpha = alpha
+        self._lock = threading.Lock()
+        self._accounts = {}
+
+    @classmethod
+    def from_env(cls):
+        return cls(
+            flood_budget_seconds=int(os.getenv('PYTHON_FLOODWAIT_BUDGET_SECONDS', '600')),
+            flood_window_seconds=int(os.getenv('PYTHON_FLOODWAIT_WINDOW_SECONDS', '3600')),
+            exclude_wait_seconds=int(os.getenv('PYTHON_FLOODWAIT_EXCLUDE_SECONDS', '60')),
+        )
+
+    def _account(self, key):
+        account = self._accounts.get(key)
+        if account is None:
+            account = {'success_rate': 1.0, 'flood_waits': [], 'flood_wait_until': 0.0, 'last_seen': 0.0}
+            self._accounts[key] = account
+        return account
+
+    def _observe(self, key, ok):
+        account = self._account(key)
+        account['success_rate'] = (1 - self.alpha) * account['success_rate'] + self.alpha * (1.0 if ok else 0.0)
+        account['last_seen'] = time.time()
+        return account
+
+    def record_success(self, key):
+        with self._lock:
+            self._observe(key, True)
+
+    def record_error(self, key):
+        with self._lock:
+            self._observe(key, False)
+
+    def record_flood_wait(self, key, seconds):
+        now = time.time()
+        with self._lock:
+            account = self._observe(key, False)
+            account['flood_waits'].append((now, seconds))
+            account['flood_wait_until'] = max(account['flood_wait_until'], now + seconds)
+
+    def weight(self, key, now=None):
+        """Return (weight, reason) where weight 0 means the account should get no channels"""
+        now = now or time.time()
+        with self._lock:
+            account = self._accounts.get(key)
+            if account is None:
+                return 1.0, None
+
+            window_start = now - self.flood_window_seconds
+            account['flood_waits'] = [(at, s) for at, s in account['flood_waits'] if at >= window_start]
+            used = sum(seconds for _, seconds in account['flood_waits'])
+            remaining_wait = account['flood_wait_until'] - now
+
+            if remaining_wait > self.exclude_wait_seconds:
+                return 0.0, f"flood_wait ({int(remaining_wait)}s left)"
+            if used >= self.flood_budget_seconds:
+                return 0.0, f"flood_wait_budget_exhausted ({used}s in window)"
+
+            budget_left = 1.0 - used / self.flood_budget_seconds if self.flood_budget_seconds else 1.0
+            health = account['success_rate'] * budget_left
+            return next(weight for floor, weight in self.WEIGHT_BANDS if health >= floor), None
+
+    def snapshot(self):
+        now = time.time()
+        with self._lock:
+            keys = list(self._accounts)
+        result = {}
+        for key in keys:
+            weight, reason = self.weight(key, now)
+            with self._lock:
+                account = self._accounts[key]
+                result[key] = {
+                    'weight': round(weight, 3),
+                    'excluded': reason,
+                    'success_rate': round(account['success_rate'], 3),
+                    'flood_wait_left': max(0, int(account['flood_wait_until'] - now)),
+                }
+        return result
+
+
+def _unit_hash(account_key, channel_key):
+    """Deterministic hash of the pair mapped into (0, 1)"""
+    digest = hashlib.sha256(f"{account_key}|{channel_key}".encode('utf-8')).digest()
+    return (int.from_bytes(digest[:8], 'big') + 1) / (2 ** 64 + 2)
+
+
+def rendezvous_score(account_key, channel_key, weight):
+    """Weighted rendezvous (HRW) score: higher wins, share proportional to weight"""
+    return -weight / math.log(_unit_hash(account_key, channel_key))
+
+
+def plan_assignments(weights, channels, load_factor=1.25):
+    """Assign each channel to one account.
+
+    weights: {account_key: weight}; accounts with weight <= 0 get nothing.
+    Each account is capped at load_factor times its fair share so one hot
+    account cannot take everything; overflow goes to the next-ranked account.
+    Capacities depend on which accounts are alive, so dropping an account can
+    also move a few channels between the accounts that remain.
+    Returns {channel: account_key}.
+    """
+    alive = {key: weight for key, weight in weights.items() if weight > 0}
+    if not alive or not channels:
+        return {}
+
+    total_weight = sum(alive.values())
+    capacity = {key: max(1, math.ceil(len(channels) * weight / total_weight * load_factor))
+                for key, weight in alive.items()}
+    load = dict.fromkeys(alive, 0)
+
+    # Visit channels in hash order so the capping is independent of input order
+    ordered = sorted({str(channel) for channel in channels},
+                     key=lambda channel: hashlib.sha256(channel.encode('utf-8')).digest())
+    assignments = {}
+    for channel in ordered:
+        ranked = sorted(alive, key=lambda key: rendezvous_score(key, channel, alive[key]), reverse=True)
+        chosen = next((key for key in ranked if load[key] < capacity[key]), ranked[0])
+        assignments[channel] = chosen
+        load[chosen] += 1
+    return assignments
@@ -0,0 +1,544 @@
+"""
+Streaming Log Analyzer
+Incrementally reads the centralized logs (Python JSON lines and the Node
+winston "timestamp [LEVEL] [service] message + JSON meta" entries) and keeps a
+small SQLite rollup of per-run and per-channel latency, skip/error rates and
+FloodWait totals.
+
+Each file is memory-mapped and read from the byte offset saved on the previous
+pass. Files are tracked by inode plus a fingerprint of their first bytes, so
+rotated files (application.log.1, application1.log, ...) are recognised and
+never read twice.
+
+Job starts/completions and the /send_message responses are logged at info, so
+latency and skip rates need BACKEND_LOG_LEVEL=info and PYTHON_LOG_LEVEL=info;
+with warn only failures are seen and a warning is printed.
+
+Usage:
+    python analyze_logs.py                       # update rollup, print summary
+    python analyze_logs.py --follow --interval 5
+    python analyze_logs.py --files ../logs/python-service.log ../logs/backend.log --json
+"""
+import argparse
+import glob
+import hashlib
+import json
+import math
+import mmap
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+from pathlib import Path
+
+FINGERPRINT_BYTES = 64
+FLUSH_EVERY = 5000
+
+WINSTON_HEADER = re.compile(rb'^(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}) \[(\w+)\] \[([\w.-]+)\] (.*)$')
+FLOOD_WAIT = re.compile(r'(?:wait of (\d+) seconds|FLOOD_WAIT_(\d+))', re.IGNORECASE)
+
+STAT_COLUMNS = ('requests', 'completed', 'skipped', 'errors', 'rejected',
+                'floodwaits', 'floodwait_seconds', 'latency_count', 'latency_sum_ms', 'latency_max_ms')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    dev INTEGER NOT NULL,
+    inode INTEGER NOT NULL,
+    path TEXT NOT NULL,
+    head_len INTEGER NOT NULL,
+    head_hash TEXT NOT NULL,
+    offset INTEGER NOT NULL,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (dev, inode)
+);
+CREATE TABLE IF NOT EXISTS stats (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    requests INTEGER NOT NULL DEFAULT 0,
+    completed INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    errors INTEGER NOT NULL DEFAULT 0,
+    rejected INTEGER NOT NULL DEFAULT 0,
+    floodwaits INTEGER NOT NULL DEFAULT 0,
+    floodwait_seconds INTEGER NOT NULL DEFAULT 0,
+    latency_count INTEGER NOT NULL DEFAULT 0,
+    latency_sum_ms INTEGER NOT NULL DEFAULT 0,
+    latency_max_ms INTEGER NOT NULL DEFAULT 0,
+    first_seen TEXT,
+    last_seen TEXT,
+    PRIMARY KEY (scope, key)
+);
+CREATE TABLE IF NOT EXISTS latency_buckets (
+    scope TEXT NOT NULL,
+    key TEXT NOT NULL,
+    bucket INTEGER NOT NULL,
+    count INTEGER NOT NULL,
+    PRIMARY KEY (scope, key, bucket)
+);
+CREATE TABLE IF NOT EXISTS pending_jobs (
+    job_id TEXT PRIMARY KEY,
+    run_id TEXT,
+    chat_id TEXT,
+    started_at REAL NOT NULL
+);
+"""
+
+
+def default_log_dir():
+    log_dir = Path(os.getenv('LOG_DIR', '../logs'))
+    if not log_dir.is_absolute():
+        log_dir = Path(__file__).parent.parent / log_dir
+    return log_dir
+
+
+# ---------------------------------------------------------------------------
+# Parsing
+# ---------------------------------------------------------------------------
+
+def _parse_timestamp(value):
+    try:
+        return datetime.strptime(value, '%Y-%m-%d %H:%M:%S').timestamp()
+    except (TypeError, ValueError):
+        return None
+
+
+def _parse_ms(value):
+    """Durations are logged as numbers or strings like '123ms'"""
+    if value is None:
+        return None
+    if isinstance(value, (int, float)):
+        return int(value)
+    match = re.match(r'^\s*(\d+(?:\.\d+)?)\s*ms\s*$', str(value))
+    return int(float(match.group(1))) if match else None
+
+
+def _flood_wait_seconds(text):
+    if not text:
+        return None
+    match = FLOOD_WAIT.search(str(text))
+    if not match:
+        return None
+    return int(match.group(1) or match.group(2))
+
+
+def iter_records(mm, start):
+    """Yield (record, end_offset) for every complete record after `start`.
+
+    JSON lines are single-line records. Winston entries are a header line plus
+    an optional pretty-printed JSON block; an entry is complete once its block
+    parses. A trailing partial line or block is left for the next pass.
+    """
+    size = len(mm)
+    pos = start
+    pending = None  # (header dict, meta lines, start offset)
+
+    def finish(entry):
+        header, meta_lines = entry[0], entry[1]
+        if meta_lines:
+            try:
+                header.update(json.loads(b''.join(meta_lines)))
+            except ValueError:
+                return None
+        return header
+
+    while pos < size:
+        newline = mm.find(b'\n', pos)
+        if newline == -1:
+            break
+        line = mm[pos:newline].rstrip(b'\r')
+        line_end = newline + 1
+
+        header = WINSTON_HEADER.match(line)
+        if header or line.startswith(b'{"'):
+            if pending is not None:
+                record = finish(pending)
+                if record is not None:
+                    yield record, pos
+            pending = None
+
+            if header:
+                timestamp, level, service, message = header.groups()
+                pending = ({
+                    'timestamp': timestamp.decode(),
+                    'level': level.decode().lower(),
+                    'service': service.decode(),
+                    'message': message.decode('utf-8', 'replace'),
+                }, [], pos)
+            else:
+                try:
+                    yield json.loads(line), line_end
+                except ValueError:
+                    pass
+        elif pending is not None:
+            pending[1].append(line + b'\n')
+        pos = line_end
+
+    # The last winston entry is only safe to consume if its meta block is whole
+    if pending is not None:
+        meta_lines = pending[1]
+        if not meta_lines or meta_lines[-1].startswith(b'}'):
+            record = finish(pending)
+            if record is not None:
+                yield record, pos
+
+
+# ---------------------------------------------------------------------------
+# Aggregation
+# ---------------------------------------------------------------------------
+
+def _bucket(ms):
+    """Power-of-two latency bucket: bucket b holds values in (2^(b-1), 2^b] ms"""
+    return 0 if ms <= 1 else int(math.ceil(math.log2(ms)))
+
+
+class Rollup:
+    """In-memory deltas for one batch, merged into SQLite on flush()"""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.stats = {}
+        self.buckets = {}
+
+    def _entry(self, scope, key, timestamp):
+        entry = self.stats.get((scope, key))
+        if entry is None:
+            entry = dict.fromkeys(STAT_COLUMNS, 0)
+            entry['first_seen'] = entry['last_seen'] = timestamp
+            self.stats[(scope, key)] = entry
+        if timestamp:
+            entry['first_seen'] = min(entry['first_seen'] or timestamp, timestamp)
+            entry['last_seen'] = max(entry['last_seen'] or timestamp, timestamp)
+        return entry
+
+    def add(self, scope, key, timestamp, latency_ms=None, **counts):
+        if key is None:
+            return
+        key = str(key)
+        entry = self._entry(scope, key, timestamp)
+        for column, value in counts.items():
+            entry[column] += value
+        if latency_ms is not None:
+            entry['latency_count'] += 1
+            entry['latency_sum_ms'] += latency_ms
+            entry['latency_max_ms'] = max(entry['latency_max_ms'], latency_ms)
+            bucket_key = (scope, key, _bucket(latency_ms))
+            self.buckets[bucket_key] = self.buckets.get(bucket_key, 0) + 1
+
+    def flush(self):
+        for (scope, key), entry in self.stats.items():
+            self.conn.execute(
+                f"""INSERT INTO stats (scope, key, {', '.join(STAT_COLUMNS)}, first_seen, last_seen)
+                    VALUES (?, ?, {', '.join('?' * len(STAT_COLUMNS))}, ?, ?)
+                    ON CONFLICT (scope, key) DO UPDATE SET
+                    {', '.join(f'{c} = {c} + excluded.{c}' for c in STAT_COLUMNS if c != 'latency_max_ms')},
+                    latency_max_ms = MAX(latency_max_ms, excluded.latency_max_ms),
+                    first_seen = COALESCE(MIN(first_seen, excluded.first_seen), first_seen, excluded.first_seen),
+                    last_seen = COALESCE(MAX(last_seen, excluded.last_seen), last_seen, excluded.last_seen)""",
+                (scope, key, *(entry[c] for c in STAT_COLUMNS), entry['first_seen'], entry['last_seen']))
+        for (scope, key, bucket), count in self.buckets.items():
+            self.conn.execute(
+                """INSERT INTO latency_buckets (scope, key, bucket, count) VALUES (?, ?, ?, ?)
+                   ON CONFLICT (scope, key, bucket) DO UPDATE SET count = count + excluded.count""",
+                (scope, key, bucket, count))
+        self.stats.clear()
+        self.buckets.clear()
+
+
+def apply_record(record, rollup, conn):
+    """Fold one log record into the rollup. Returns True if it was relevant."""
+    timestamp = record.get('timestamp')
+    event = record.get('event')
+    operation = record.get('operation')
+
+    # Node worker events: per-run statistics (the lock logs share operation but have no runId)
+    if (operation == 'process_job' and record.get('message') == 'Worker processing job'
+            and record.get('jobId') is not None and record.get('runId') is not None):
+        conn.execute("INSERT OR REPLACE INTO pending_jobs VALUES (?, ?, ?, ?)",
+                     (str(record['jobId']), record.get('runId'), record.get('chatId'),
+                      _parse_timestamp(timestamp) or 0))
+        rollup.add('run', record.get('runId'), timestamp, requests=1)
+        return True
+
+    if event in ('job_completed', 'job_attempt_failed'):
+        latency = _parse_ms(record.get('durationMs'))
+        pending = conn.execute("SELECT started_at FROM pending_jobs WHERE job_id = ?",
+                               (str(record.get('jobId')),)).fetchone()
+        if latency is None and pending and pending[0] and _parse_timestamp(timestamp):
+            latency = int((_parse_timestamp(timestamp) - pending[0]) * 1000)
+        conn.execute("DELETE FROM pending_jobs WHERE job_id = ?", (str(record.get('jobId')),))
+
+        if event == 'job_completed':
+            rollup.add('run', record.get('runId'), timestamp, latency_ms=latency,
+                       completed=1, skipped=1 if record.get('skipped') else 0)
+        else:
+            flood_wait = _flood_wait_seconds(record.get('error'))
+            rollup.add('run', record.get('runId'), timestamp, latency_ms=latency,
+                       rejected=1 if record.get('statusCode') == 429 else 0,
+                       floodwaits=1 if flood_wait is not None else 0,
+                       floodwait_seconds=flood_wait or 0)
+        return True
+
+    if event == 'job_admission_delayed':
+        # 429 from the Python service; the job is re-delayed and will log a new start
+        conn.execute("DELETE FROM pending_jobs WHERE job_id = ?", (str(record.get('jobId')),))
+        rollup.add('run', record.get('runId'), timestamp, rejected=1)
+        return True
+
+    if event == 'job_failed':
+        job_data = record.get('jobData') or {}
+        rollup.add('run', job_data.get('run_id'), timestamp, errors=1)
+        return True
+
+    # Python service events: per-channel statistics
+    if operation == 'http_response' and record.get('url') == '/send_message':
+        status = record.get('statusCode') or 0
+        rollup.add('channel', record.get('chatId'), timestamp,
+                   latency_ms=_parse_ms(record.get('duration')),
+                   requests=1,
+                   completed=1 if status < 400 else 0,
+                   skipped=1 if record.get('skipped') else 0,
+                   rejected=1 if status == 429 else 0,
+                   errors=1 if status >= 400 and status != 429 else 0)
+        return True
+
+    if operation == 'error' and record.get('errorOperation') == 'SEND_MESSAGE':
+        flood_wait = _flood_wait_seconds(record.get('error'))
+        if flood_wait is not None:
+            rollup.add('channel', record.get('chatId'), timestamp,
+                       floodwaits=1, floodwait_seconds=flood_wait)
+            return True
+
+    return False
+
+
+# ---------------------------------------------------------------------------
+# File tracking
+# ---------------------------------------------------------------------------
+
+def rotation_family(path):
+    """Return the base file and its rotated siblings, oldest first.
+
+    Python's RotatingFileHandler uses name.log.N, winston's tailable File
+    transport uses nameN.log; higher N is older in both schemes.
+    """
+    path = Path(path)
+    candidates = {}
+    for rotated in glob.glob(glob.escape(str(path)) + '.*'):
+        suffix = rotated[len(str(path)) + 1:]
+        if suffix.isdigit():
+            candidates[rotated] = int(suffix)
+    stem_pattern = glob.escape(str(path.with_suffix(''))) + '*' + path.suffix
+    for rotated in glob.glob(stem_pattern):
+        number = rotated[len(str(path.with_suffix(''))):len(rotated) - len(path.suffix)]
+        if number.isdigit():
+            candidates[rotated] = int(number)
+    ordered = sorted(candidates, key=candidates.get, reverse=True)
+    if path.exists():
+        ordered.append(str(path))
+    return ordered
+
+
+def _fingerprint(mm, length):
+    return hashlib.sha1(mm[:length]).hexdigest()
+
+
+class LogAnalyzer:
+    def __init__(self, db_path):
+        self.conn = sqlite3.connect(db_path)
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        self.conn.close()
+
+    def _known_offset(self, stat, mm):
+        row = self.conn.execute("SELECT head_len, head_hash, offset FROM files WHERE dev = ? AND inode = ?",
+                                (stat.st_dev, stat.st_ino)).fetchone()
+        if row is None:
+            return 0
+        head_len, head_hash, offset = row
+        if head_len > len(mm) or _fingerprint(mm, head_len) != head_hash or offset > len(mm):
+            return 0  # inode reused or file truncated
+        return offset
+
+    def _save_offset(self, path, stat, mm, offset):
+        head_len = min(FINGERPRINT_BYTES, len(mm))
+        self.conn.execute(
+            """INSERT INTO files (dev, inode, path, head_len, head_hash, offset, updated_at)
+               VALUES (?, ?, ?, ?, ?, ?, ?)
+               ON CONFLICT (dev, inode) DO UPDATE SET path = excluded.path, head_len = excluded.head_len,
+               head_hash = excluded.head_hash, offset = excluded.offset, updated_at = excluded.updated_at""",
+            (stat.st_dev, stat.st_ino, path, head_len, _fingerprint(mm, head_len), offset, time.time()))
+
+    def process_file(self, path):
+        """Consume new complete records from one file; returns (records, bytes)"""
+        try:
+            with open(path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_size == 0:
+                    return 0, 0
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    start = self._known_offset(stat, mm)
+                    rollup = Rollup(self.conn)
+                    offset = start
+                    relevant = 0
+                    unflushed = 0
+                    for record, end in iter_records(mm, start):
+                        if isinstance(record, dict) and apply_record(record, rollup, self.conn):
+                            relevant += 1
+                            unflushed += 1
+                        offset = end
+                        if unflushed >= FLUSH_EVERY:
+                            unflushed = 0
+                            rollup.flush()
+                            self._save_offset(path, stat, mm, offset)
+                            self.conn.commit()
+                    rollup.flush()
+                    self._save_offset(path, stat, mm, offset)
+                    self.conn.commit()
+                    return relevant, offset - start
+        except FileNotFoundError:
+            return 0, 0  # rotated away between listing and opening
+
+    def prune_files(self, live_files):
+        """Forget offsets for files that no longer exist"""
+        live = set()
+        for path in live_files:
+            try:
+                stat = os.stat(path)
+                live.add((stat.st_dev, stat.st_ino))
+            except FileNotFoundError:
+                pass
+        for dev, inode in self.conn.execute("SELECT dev, inode FROM files").fetchall():
+            if (dev, inode) not in live:
+                self.conn.execute("DELETE FROM files WHERE dev = ? AND inode = ?", (dev, inode))
+        self.conn.commit()
+
+    def update(self, log_files):
+        """One incremental pass over every log file and its rotations"""
+        all_files = []
+        records = 0
+        consumed = 0
+        for log_file in log_files:
+            family = rotation_family(log_file)
+            all_files.extend(family)
+            for path in family:
+                relevant, read = self.process_file(path)
+                records += relevant
+                consumed += read
+        self.prune_files(all_files)
+        return records, consumed
+
+    # -- reporting ----------------------------------------------------------
+
+    def _percentile(self, scope, key, total, pct, max_ms):
+        """Upper bound of the bucket holding the percentile, capped at the observed max"""
+        if not total:
+            return None
+        target = total * pct / 100.0
+        running = 0
+        for bucket, count in self.conn.execute(
+                "SELECT bucket, count FROM latency_buckets WHERE scope = ? AND key = ? ORDER BY bucket",
+                (scope, key)):
+            running += count
+            if running >= target:
+                return min(2 ** bucket, max_ms)
+        return None
+
+    def summary(self, scope, limit=20):
+        rows = self.conn.execute(
+            f"""SELECT key, {', '.join(STAT_COLUMNS)}, first_seen, last_seen FROM stats
+                WHERE scope = ? ORDER BY last_seen DESC LIMIT ?""", (scope, limit)).fetchall()
+        result = []
+        for row in rows:
+            key, values, (first_seen, last_seen) = row[0], dict(zip(STAT_COLUMNS, row[1:-2])), row[-2:]
+            attempts = values['completed'] + values['errors']
+            result.append({
+                'key': key,
+                **{column: values[column] for column in STAT_COLUMNS[:7]},
+                'skip_rate': round(values['skipped'] / values['completed'], 3) if values['completed'] else None,
+                'error_rate': round(values['errors'] / attempts, 3) if attempts else None,
+                'latency_avg_ms': round(values['latency_sum_ms'] / values['latency_count']) if values['latency_count'] else None,
+                'latency_p50_ms': self._percentile(scope, key, values['latency_count'], 50, values['latency_max_ms']),
+                'latency_p95_ms': self._percentile(scope, key, values['latency_count'], 95, values['latency_max_ms']),
+                'latency_max_ms': values['latency_max_ms'] if values['latency_count'] else None,
+                'first_seen': first_seen,
+                'last_seen': last_seen,
+            })
+        return result
+
+    def missing_completions_warning(self):
+        """Explain empty latency/skip stats when only warn-level events reached the logs"""
+        completed = self.conn.execute("SELECT COALESCE(SUM(completed), 0) FROM stats").fetchone()[0]
+        if completed:
+            return None
+        return ("No completion events found (job_completed / /send_message http_response are logged at info). "
+                "Set BACKEND_LOG_LEVEL=info and PYTHON_LOG_LEVEL=info to get latency and skip rates.")
+
+
+def print_table(title, rows):
+    print(f"\n{title}")
+    print('-' * 110)
+    if not rows:
+        print("  (no data)")
+        return
+    print(f"  {'key':<28} {'req':>6} {'done':>6} {'skip%':>6} {'err%':>6} {'429':>5} {'FW':>4} {'FW s':>6} "
+          f"{'avg ms':>8} {'p50':>7} {'p95':>7}")
+    for row in rows:
+        def pct(value):
+            return f"{value * 100:.1f}" if value is not None else '-'
+
+        def num(value):
+            return str(value) if value is not None else '-'
+        print(f"  {row['key'][:28]:<28} {row['requests']:>6} {row['completed']:>6} {pct(row['skip_rate']):>6} "
+              f"{pct(row['error_rate']):>6} {row['rejected']:>5} {row['floodwaits']:>4} {row['floodwait_seconds']:>6} "
+              f"{num(row['latency_avg_ms']):>8} {num(row['latency_p50_ms']):>7} {num(row['latency_p95_ms']):>7}")
+
+
+def main():
+    log_dir = default_log_dir()
+    parser = argparse.ArgumentParser(description="Incremental analyzer for the centralized JSON logs")
+    parser.add_argument('--files', nargs='+',
+                        default=[str(log_dir / os.getenv('CENTRALIZED_LOG_FILE', 'application.log'))],
+                        help="Log files to follow (rotated siblings are picked up automatically)")
+    parser.add_argument('--db', default=str(log_dir / 'log-rollup.db'), help="SQLite rollup/state file")
+    parser.add_argument('--limit', type=int, default=20, help="Rows per table in the summary")
+    parser.add_argument('--json', action='store_true', help="Print the summary as JSON")
+    parser.add_argument('--follow', action='store_true', help="Keep updating every --interval seconds")
+    parser.add_argument('--interval', type=float, default=5.0)
+    args = parser.parse_args()
+
+    analyzer = LogAnalyzer(args.db)
+    warned = False
+    try:
+        while True:
+            started = time.monotonic()
+            records, consumed = analyzer.update(args.files)
+            elapsed = time.monotonic() - started
+            summary = {
+                'runs': analyzer.summary('run', args.limit),
+                'channels': analyzer.summary('channel', args.limit),
+            }
+            warning = analyzer.missing_completions_warning()
+            if warning and not warned:
+                print(f"⚠️ {warning}", file=sys.stderr)
+                warned = True
+            if args.json:
+                print(json.dumps({'records': records, 'bytes': consumed, 'warning': warning, **summary}, indent=2))
+            else:
+                print(f"📊 Processed {records} relevant records ({consumed / 1024:.1f} KB new) in {elapsed:.2f}s")
+                print_table("🔄 Runs (most recent first)", summary['runs'])
+                print_table("📡 Channels (most recent first)", summary['channels'])
+            if not args.follow:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        analyzer.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,13 +2,17 @@
 Flask Alternative for Pyrogram Service
 Use this if FastAPI has compatibility issues with Python 3.12
 """
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, send_file, g
 from flask_cors import CORS
 from pyrogram import Client, errors
 import asyncio
 import logging
 import sqlite3
 import os
+import io
+import hmac
+import threading
+import time
 from pathlib import Path
 
 # Load environment variables from parent .env file
@@ -23,10 +27,137 @@ except ImportError:
 
 # Use centralized logging
 from logger_config import logger, log_request, log_response, log_telegram_operation, log_database_operation, log_error
+from admission import AdmissionController, AdmissionRejected, session_key
+from session_registry import SessionRegistry, UnknownSessionHandle
+from serving import create_tcp_server, create_unix_server
+from profiling import SlowRequestProfiler, profile_process
+import telegram_trace
+from media_pipeline import MediaPipeline, MediaValidationError, trace_info
+from affinity import AccountHealth, plan_assignments
+from message_records import iter_history, iter_replies, normalize_text
+from functools import wraps
 
 app = Flask(__name__)
 CORS(app)
 
+# Admission control: bound concurrent Telegram operations and shed load early
+admission = AdmissionController.from_env()
+
+# Worker threads per listener: enough for every admitted request plus the admission queue,
+# so excess load waits in AdmissionController (and gets 429s) rather than in the server
+SERVICE_THREADS = int(os.getenv('PYTHON_SERVICE_THREADS', str(admission.max_inflight + admission.max_queue)))
+
+# Registered sessions, so callers can send a short handle instead of the full string
+session_registry = SessionRegistry.from_env()
+
+def resolve_session_string(data):
+    """Return the session string from `session_string` or a registered `session_handle`"""
+    session_string = data.get("session_string")
+    if session_string:
+        return session_string
+    session_handle = data.get("session_handle")
+    if session_handle:
+        return session_registry.resolve(session_handle)
+    return None
+
+# Record mode: capture each Pyrogram call made by the handlers for offline replay
+trace_recorder = telegram_trace.TraceRecorder.from_env()
+
+def make_client(name, session_string):
+    """Create a Pyrogram client, routed through the active record/replay trace if any"""
+    return telegram_trace.wrap_client(lambda: Client(name, session_string=session_string))
+
+def recorded(view):
+    """Record the handler's Telegram traffic when PYTHON_TRACE_RECORD is set"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        if trace_recorder is None or telegram_trace.current_trace() is not None:
+            return view(*args, **kwargs)
+        token = trace_recorder.begin(request.path, request.get_json(silent=True))
+        status_code = 500
+        try:
+            rv = view(*args, **kwargs)
+            status_code = rv[1] if isinstance(rv, tuple) else getattr(rv, 'status_code', 200)
+            return rv
+        finally:
+            try:
+                trace_recorder.finish(token, status_code)
+            except Exception as e:
+                logger.error(f"Failed to write Telegram trace: {e}")
+    return wrapper
+
+# Media: local validation/probing cache and resumable chunked video uploads
+MEDIA_PIPELINE_ENABLED = os.getenv('PYTHON_MEDIA_PIPELINE', 'true').lower() == 'true'
+media_pipeline = MediaPipeline()
+
+# Account health (success rate, FloodWait budget) feeding the channel affinity planner
+account_health = AccountHealth.from_env()
+
+# Failures that say something about the account itself: a revoked or banned session, a spam
+# restriction, or a broken connection. A dead channel or a post with nothing to comment on
+# is the target's problem and must not move the account's other channels.
+ACCOUNT_ERRORS = (errors.Unauthorized, errors.AuthKeyDuplicated, errors.PeerFlood, OSError, asyncio.TimeoutError)
+
+# Opt-in profiling: /debug/profile and automatic dumps for slow requests
+PROFILING_ENABLED = os.getenv('PYTHON_PROFILING_ENABLED', 'false').lower() == 'true'
+MAX_PROFILE_SECONDS = 120
+slow_request_profiler = SlowRequestProfiler.from_env()
+if slow_request_profiler:
+    slow_request_profiler.start()
+
+@app.before_request
+def start_slow_request_profile():
+    if slow_request_profiler:
+        g.slow_profile_started_at = slow_request_profiler.begin()
+
+@app.teardown_request
+def finish_slow_request_profile(exc):
+    started_at = g.pop('slow_profile_started_at', None)
+    if slow_request_profiler and started_at is not None:
+        path = slow_request_profiler.end(started_at, request.path)
+        if path:
+            logger.warning(f"🐢 Slow request {request.method} {request.path}, profile dumped to {path}", extra={
+                'operation': 'slow_request_profile',
+                'url': request.path,
+                'profilePath': str(path)
+            })
+
+@app.errorhandler(UnknownSessionHandle)
+def unknown_session_handle(e):
+    """Tell the caller to register the session again (e.g. after a restart)"""
+    logger.warning(f"⚠️ Unknown session handle: {e.args[0]}")
+    return jsonify({
+        "success": False,
+        "error": "Unknown session handle, register the session again",
+        "error_code": "unknown_session_handle"
+    }), 404
+
+def admitted(view):
+    """Run the view only if a global and per-session slot is available, else 429"""
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        data = request.get_json(silent=True) or {}
+        key = session_key(resolve_session_string(data))
+        try:
+            started_at = admission.acquire(key)
+        except AdmissionRejected as e:
+            logger.warning(f"🚦 Admission rejected for {request.path}: {e.reason}", extra={
+                'operation': 'admission_rejected',
+                'url': request.path,
+                'reason': e.reason,
+                'retryAfter': e.retry_after,
+                'sessionKey': key
+            })
+            log_response(request.method, request.path, 429, reason=e.reason)
+            response = jsonify({"success": False, "error": str(e), "retry_after": e.retry_after})
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response, 429
+        try:
+            return view(*args, **kwargs)
+        finally:
+            admission.release(key, started_at)
+    return wrapper
+
 def format_channels_with_spacing():
     """Format channels with proper spacing between categories"""
     db_path = os.path.join(os.path.dirname(__file__), '..', 'db', 'telegram_app.db')
@@ -95,13 +226,121 @@ def health_check():
     logger.info("Health check called")
     return jsonify({"status": "healthy", "service": "python-pyrogram-service-flask"})
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Runtime metrics (admission queue depth, in-flight operations)"""
+    return jsonify({
+        "service": "python-pyrogram-service-flask",
+        "admission": admission.stats(),
+        "uploads": media_pipeline.progress.active(),
+        "accounts": account_health.snapshot()
+    })
+
+@app.route('/uploads/<job_id>', methods=['GET'])
+def upload_progress(job_id):
+    """Upload progress of a send_message job (pass job_id in the send_message body)"""
+    progress = media_pipeline.progress.get(job_id)
+    if not progress:
+        return jsonify({"success": False, "error": "No upload found for this job"}), 404
+    return jsonify({"success": True, "upload": progress})
+
+
+
+@app.route('/debug/profile', methods=['GET', 'POST'])
+def debug_profile():
+    """Sample all threads of the live process for N seconds and return the profile"""
+    if not PROFILING_ENABLED:
+        return jsonify({"success": False, "error": "Profiling is disabled"}), 404
+
+    expected_secret = os.getenv('INTERNAL_SECRET', '')
+    provided_secret = request.headers.get('x-internal-secret', '')
+    if not expected_secret or not hmac.compare_digest(provided_secret, expected_secret):
+        return jsonify({"success": False, "error": "Unauthorized"}), 403
+
+    try:
+        seconds = float(request.args.get('seconds', 10))
+        interval = float(request.args.get('interval_ms', 10)) / 1000.0
+    except ValueError:
+        return jsonify({"success": False, "error": "seconds and interval_ms must be numbers"}), 400
+    fmt = request.args.get('format', 'collapsed')
+    if fmt not in ('collapsed', 'pstats'):
+        return jsonify({"success": False, "error": "format must be 'collapsed' or 'pstats'"}), 400
+    if not 0 < seconds <= MAX_PROFILE_SECONDS or not 0.001 <= interval <= 1:
+        return jsonify({"success": False, "error": f"seconds must be in (0, {MAX_PROFILE_SECONDS}] and interval_ms in [1, 1000]"}), 400
+
+    logger.info(f"🔬 Profiling process for {seconds}s (format={fmt}, interval={interval * 1000:.0f}ms)")
+    profile = profile_process(seconds, interval)
+    body, filename, mimetype = profile.render(fmt)
+    logger.info(f"🔬 Profile complete: {profile.total_samples} samples")
+    return send_file(io.BytesIO(body), mimetype=mimetype, as_attachment=True, download_name=filename)
+
+@app.route('/plan_assignments', methods=['POST'])
+def plan_channel_assignments():
+    """Assign a run's target channels to its sessions with sticky, health-weighted hashing"""
+    data = request.json
+    sessions = data.get("sessions") or []
+    targets = data.get("targets") or []
+
+    if not sessions or not targets:
+        return jsonify({"success": False, "error": "sessions and targets are required"}), 400
+
+    weights = {}
+    accounts = []
+    session_ids = {}
+    for session in sessions:
+        key = session_key(resolve_session_string(session))
+        weight, excluded = account_health.weight(key)
+        weights[key] = weight
+        session_ids[key] = session.get("id")
+        accounts.append({"id": session.get("id"), "weight": round(weight, 3), "excluded": excluded})
+
+    degraded = not any(weight > 0 for weight in weights.values())
+    if degraded:
+        # Every account is over budget: still spread the run rather than dropping it
+        weights = dict.fromkeys(weights, 1.0)
+
+    assignments = plan_assignments(weights, targets)
+    for account in accounts:
+        account["assigned"] = sum(1 for key in assignments.values() if session_ids[key] == account["id"])
+
+    logger.info(f"🧭 Planned {len(assignments)} channels over {len(sessions)} sessions", extra={
+        'operation': 'plan_assignments',
+        'accounts': accounts,
+        'degraded': degraded
+    })
+    return jsonify({
+        "success": True,
+        "assignments": {channel: session_ids[key] for channel, key in assignments.items()},
+        "accounts": accounts,
+        "degraded": degraded
+    })
+
+@app.route('/sessions/register', methods=['POST'])
+def register_session():
+    """Register a session string once and get back a short handle for later calls"""
+    data = request.json
+    session_string = data.get("session_string")
+
+    if not session_string:
+        return jsonify({"success": False, "error": "session_string is required"}), 400
+
+    handle = session_registry.register(session_string)
+    logger.debug(f"🔑 Registered session handle {handle} (registry size: {len(session_registry)})")
+    return jsonify({"success": True, "session_handle": handle})
 
+@app.route('/sessions/<handle>', methods=['DELETE'])
+def unregister_session(handle):
+    """Forget a registered session handle"""
+    removed = session_registry.unregister(handle)
+    return jsonify({"success": True, "removed": removed})
 
 @app.route('/validate_session', methods=['POST'])
+@admitted
+@recorded
 def validate_session():
     """Validate an existing session string - Standard approach"""
     data = request.json
-    session_string = data.get("session_string")
+    session_string = resolve_session_string(data)
     
     if not session_string:
         return jsonify({"success": False, "error": "session_string is required"}), 400
@@ -109,7 +348,7 @@ def validate_session():
     try:
         async def _validate():
             # Use session string like in updated standard approach
-            client = Client('validation_session', session_string=session_string)
+            client = make_client('validation_session', session_string)
             await client.start()
             
             # Get user info like in standard
@@ -141,14 +380,17 @@ def validate_session():
         }), 200
 
 @app.route('/send_message', methods=['POST'])
+@admitted
+@recorded
 def send_message():
     """Send a comment to a channel post"""
     data = request.json
-    session_string = data.get("session_string")
+    session_string = resolve_session_string(data)
     chat_id = data.get("chat_id")
     message_type = data.get("message_type")
     file_path = data.get("file_path")
     caption = data.get("caption", "")
+    job_id = data.get("job_id")
     
     log_request('POST', '/send_message', 
                 chatId=chat_id, 
@@ -161,12 +403,26 @@ def send_message():
         logger.error(f"❌ Missing required parameters: session_string={bool(session_string)}, chat_id={bool(chat_id)}")
         return jsonify({"success": False, "error": "session_string and chat_id are required"}), 400
     
+    # Validate and probe media before connecting, so bad files fail without transferring bytes
+    media_info = None
+    if file_path and message_type in ["photo", "video"]:
+        try:
+            # Traced so offline replay gets the recorded metadata instead of probing a missing file
+            media_info = telegram_trace.traced_value(
+                'probe_media', media_pipeline.probe, (file_path, message_type),
+                project=trace_info, error_types=(MediaValidationError,))
+        except MediaValidationError as e:
+            logger.error(f"❌ Invalid media file: {e}")
+            log_response('POST', '/send_message', 400, chatId=chat_id, error=str(e))
+            return jsonify({"success": False, "error": str(e), "error_code": "invalid_media"}), 400
+    
+    request_started = time.monotonic()
     try:
         logger.debug(f"🚀 Starting async send operation for chat_id: {chat_id}")
         
         async def _send():
             logger.debug(f"🔧 Creating Pyrogram client for session")
-            client = Client("temp_client", session_string=session_string)
+            client = make_client("temp_client", session_string)
             
             logger.debug(f"🔌 Starting Pyrogram client connection")
             await client.start()
@@ -237,21 +493,22 @@ def send_message():
             # Check for duplicate comments - following standard approach
             logger.debug(f"🔍 Starting duplicate comment check in chat history (limit=30)")
             
+            # History and comments are streamed as compact MessageRecords; raw objects are dropped immediately
+            reply_needle = normalize_text(reply_text)
             try:
                 message_count = 0
-                async for message in client.get_chat_history(chat_id=chat_id, limit=30):
+                async for message, _ in iter_history(client, chat_id, 30):
                     message_count += 1
                     logger.debug(f"📨 Processing message {message_count}: id={message.id}, date={message.date}")
                     
                     try:
                         comment_count = 0
-                        async for comment in client.get_discussion_replies(chat_id=chat_id, message_id=message.id, limit=10):
+                        async for comment, comment_text in iter_replies(client, chat_id, message.id, 10):
                             comment_count += 1
-                            comment_text = comment.text if comment.text else comment.caption
-                            logger.debug(f"💬 Comment {comment_count} in message {message.id}: text_length={len(comment_text) if comment_text else 0}")
+                            logger.debug(f"💬 Comment {comment_count} in message {message.id}: text_length={len(comment_text)}")
                             
                             if comment_text and reply_text:
-                                if reply_text.strip().lower() in comment_text.strip().lower():
+                                if reply_needle in comment_text:
                                     logger.debug(f"🔍 DUPLICATE FOUND! Reply text already exists in comment {comment.id}")
                                     comment_found = True
                                     message_id_to_comment = message.id
@@ -285,15 +542,15 @@ def send_message():
             
             if comment_found:
                 logger.info(f"⏭️ SKIPPING: Duplicate comment found - message_id={result.id}, parent_id={message_id_to_comment}")
-                logger.debug(f"📊 Skipped comment details: chat_id={result.chat.id}, date={result.date}")
+                logger.debug(f"📊 Skipped comment details: chat_id={result.chat_id}, date={result.date_isoformat()}")
                 await client.stop()
                 return {
                     "success": True,
                     "skipped": True,
                 "data": {
                     "message_id": result.id,
-                    "chat_id": result.chat.id,
-                    "date": result.date.isoformat() if result.date else None,
+                    "chat_id": result.chat_id,
+                    "date": result.date_isoformat(),
                     "parent_message_id": message_id_to_comment
                 }
                 }
@@ -310,18 +567,28 @@ def send_message():
             # Send comment
             logger.debug(f"📤 Preparing to send comment: type={message_type}, has_file={bool(file_path)}")
             
-            if file_path and message_type in ["photo", "video"]:
-                import os
-                ext = os.path.splitext(file_path)[1].lower()
-                logger.debug(f"📁 File details: path={file_path}, extension={ext}")
+            if media_info:
+                logger.debug(f"📁 File details: path={file_path}, kind={media_info['kind']}, size={media_info['size']}")
                 
-                if message_type == "photo" or ext in [".png", ".jpg", ".jpeg", ".gif"]:
+                if media_info['kind'] == "photo":
                     logger.debug(f"📸 Sending photo with caption: caption_length={len(reply_text)}")
                     result = await discussion_message.reply_photo(photo=file_path, caption=reply_text)
                     logger.debug(f"✅ Photo sent successfully: result_id={result.id}")
+                elif MEDIA_PIPELINE_ENABLED:
+                    logger.debug(f"🎥 Sending video via resumable upload: caption_length={len(reply_text)}")
+                    result = await telegram_trace.traced_call(
+                        'reply_video', media_pipeline.reply_video,
+                        client, discussion_message, media_info, reply_text, session_key(session_string), job_id,
+                        trace_args={'video': {'file_size': media_info['size']},
+                                    'caption': {'length': len(reply_text)}})
+                    logger.debug(f"✅ Video sent successfully: result_id={result.id}")
                 else:
                     logger.debug(f"🎥 Sending video with caption: caption_length={len(reply_text)}")
-                    result = await discussion_message.reply_video(video=file_path, caption=reply_text)
+                    result = await discussion_message.reply_video(
+                        video=file_path, caption=reply_text,
+                        duration=media_info['duration'], width=media_info['width'],
+                        height=media_info['height'], thumb=media_info['thumb'],
+                        supports_streaming=True)
                     logger.debug(f"✅ Video sent successfully: result_id={result.id}")
             else:
                 logger.debug(f"💬 Sending text message: text_length={len(reply_text)}")
@@ -355,26 +622,39 @@ def send_message():
         
         # Log response
         status_code = 200 if result.get('success') else 500
+        if result.get('success'):
+            account_health.record_success(session_key(session_string))
         log_response('POST', '/send_message', status_code,
+                    duration=int((time.monotonic() - request_started) * 1000),
+                    chatId=chat_id,
                     success=result.get('success'),
                     skipped=result.get('skipped'),
                     messageId=result.get('data', {}).get('message_id') if result.get('success') else None)
         
         return jsonify(result)
     except Exception as e:
+        if isinstance(e, errors.FloodWait):
+            account_health.record_flood_wait(session_key(session_string), e.value)
+        elif isinstance(e, ACCOUNT_ERRORS):
+            account_health.record_error(session_key(session_string))
         log_error('SEND_MESSAGE', e, 
                  chatId=chat_id,
                  messageType=message_type,
                  hasFile=bool(file_path))
         
-        log_response('POST', '/send_message', 500, error=str(e))
+        log_response('POST', '/send_message', 500,
+                    duration=int((time.monotonic() - request_started) * 1000),
+                    chatId=chat_id,
+                    error=str(e))
         return jsonify({"success": False, "error": str(e)}), 500
 
 @app.route('/get_me', methods=['POST'])
+@admitted
+@recorded
 def get_me():
     """Get information about the current user - Standard approach"""
     data = request.json
-    session_string = data.get("session_string")
+    session_string = resolve_session_string(data)
     
     if not session_string:
         return jsonify({"success": False, "error": "session_string is required"}), 400
@@ -382,7 +662,7 @@ def get_me():
     try:
         async def _get_me():
             # Use updated standard approach with start/stop
-            client = Client("user_info_session", session_string=session_string)
+            client = make_client("user_info_session", session_string)
             await client.start()
             me = await client.get_me()
             await client.stop()
@@ -405,6 +685,18 @@ def get_me():
         logger.error(f"Get user info error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
+def serve_unix_socket(socket_path):
+    """Serve the app on a Unix domain socket (waitress, keep-alive) in a background thread"""
+    server = create_unix_server(app, socket_path, SERVICE_THREADS)
+    thread = threading.Thread(target=server.run, name="unix-socket-server", daemon=True)
+    thread.start()
+    logger.info(f"🔌 Listening on Unix socket {socket_path}")
+    return server
+
 if __name__ == "__main__":
+    socket_path = os.getenv('PYTHON_SERVICE_SOCKET')
+    if socket_path:
+        serve_unix_socket(socket_path)
+
     print("🚀 Starting Flask Pyrogram Service on port 8000...")
-    app.run(host="0.0.0.0", port=8000, debug=False)
+    create_tcp_server(app, "0.0.0.0", 8000, SERVICE_THREADS).run()
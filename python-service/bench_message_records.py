@@ -0,0 +1,183 @@
+"""
+Memory Benchmark: full Message objects vs projected MessageRecords
+Measures the per-job peak allocation (tracemalloc) of the duplicate-comment
+scan in send_message: one GetHistory page of 30 channel posts (videos with
+captions) and one GetReplies page of 10 comments from 10 users.
+
+"before" is the previous scan: client.get_chat_history/get_discussion_replies,
+which parse every page into Pyrogram Message objects. "after" is the current
+scan through message_records.iter_history/iter_replies.
+
+Both paths run against the same fake client: invoke() deserializes
+pre-serialized raw pages, so TL objects are allocated inside the measured
+window just as when they arrive from Telegram. Needs pyrogram (requirements.txt).
+
+Usage:
+    python bench_message_records.py [--posts 30] [--comments 10] [--jobs 200]
+"""
+import argparse
+import asyncio
+import gc
+import random
+import string
+import tracemalloc
+from io import BytesIO
+
+from pyrogram import Client, raw
+from pyrogram.raw.core import TLObject
+
+from message_records import iter_history, iter_replies, normalize_text
+
+CHANNEL_ID = 1500000001
+DISCUSSION_ID = 1500000002
+NEEDLE = 'Promo channel list 2026'
+
+
+def _text(length):
+    return ''.join(random.choice(string.ascii_letters + ' ') for _ in range(length))
+
+
+def _channel(channel_id, broadcast):
+    return raw.types.Channel(
+        id=channel_id, title=_text(24), photo=raw.types.ChatPhoto(photo_id=random.getrandbits(62), dc_id=4),
+        date=1700000000, broadcast=broadcast, megagroup=not broadcast, has_link=True,
+        access_hash=random.getrandbits(62), username=_text(12).replace(' ', '_'), participants_count=1000)
+
+
+def _video():
+    return raw.types.MessageMediaDocument(document=raw.types.Document(
+        id=random.getrandbits(62), access_hash=random.getrandbits(62), file_reference=random.randbytes(24),
+        date=1760000000, mime_type='video/mp4', size=10 ** 7, dc_id=4,
+        attributes=[raw.types.DocumentAttributeVideo(duration=30, w=1280, h=720, supports_streaming=True),
+                    raw.types.DocumentAttributeFilename(file_name=_text(20) + '.mp4')],
+        thumbs=[raw.types.PhotoSize(type='m', w=320, h=180, size=9000)]))
+
+
+def history_page(posts):
+    messages = [
+        raw.types.Message(
+            id=1000 + i, peer_id=raw.types.PeerChannel(channel_id=CHANNEL_ID), date=1760000000 + i,
+            message=_text(200), post=True, media=_video(), views=100, forwards=0,
+            replies=raw.types.MessageReplies(replies=10, replies_pts=1, comments=True, channel_id=DISCUSSION_ID))
+        for i in reversed(range(posts))]
+    return raw.types.messages.ChannelMessages(
+        pts=1, count=posts, messages=messages, topics=[], chats=[_channel(CHANNEL_ID, True)], users=[])
+
+
+def replies_page(post_id, comments):
+    users = [raw.types.User(id=7000 + j, access_hash=random.getrandbits(62), first_name=_text(10),
+                            last_name=_text(10), username=_text(12).replace(' ', '_'),
+                            photo=raw.types.UserProfilePhoto(photo_id=random.getrandbits(62), dc_id=4),
+                            status=raw.types.UserStatusRecently())
+             for j in range(comments)]
+    messages = [
+        raw.types.Message(
+            id=50000 + j, peer_id=raw.types.PeerChannel(channel_id=DISCUSSION_ID), date=1760000100 + j,
+            message=_text(300), from_id=raw.types.PeerUser(user_id=users[j].id),
+            reply_to=raw.types.MessageReplyHeader(reply_to_msg_id=post_id, reply_to_top_id=post_id))
+        for j in range(comments)]
+    # The duplicate is the last comment, so the whole page is scanned
+    messages[-1].message = _text(50) + NEEDLE + _text(50)
+    return raw.types.messages.ChannelMessages(
+        pts=1, count=comments, messages=messages, topics=[],
+        chats=[_channel(CHANNEL_ID, True), _channel(DISCUSSION_ID, False)], users=users)
+
+
+class BenchClient(Client):
+    """Never connects; answers GetHistory/GetReplies from serialized pages"""
+
+    def __init__(self, history, replies):
+        super().__init__('bench', in_memory=True, no_updates=True)
+        self._history = history.write()
+        self._replies = replies.write()
+
+    async def resolve_peer(self, peer_id):
+        return raw.types.InputPeerChannel(channel_id=CHANNEL_ID, access_hash=0)
+
+    async def invoke(self, query, *args, **kwargs):
+        data = self._history if isinstance(query, raw.functions.messages.GetHistory) else self._replies
+        return TLObject.read(BytesIO(data))
+
+
+async def scan_before(client, chat_id, reply_text):
+    """Previous send_message scan: parsed Message objects"""
+    result = None
+    async for message in client.get_chat_history(chat_id=chat_id, limit=30):
+        async for comment in client.get_discussion_replies(chat_id=chat_id, message_id=message.id, limit=10):
+            comment_text = comment.text if comment.text else comment.caption
+            if comment_text and reply_text.strip().lower() in comment_text.strip().lower():
+                result = comment
+                break
+        break
+    return result
+
+
+async def scan_after(client, chat_id, reply_text):
+    """Current send_message scan: projected MessageRecords"""
+    result = None
+    reply_needle = normalize_text(reply_text)
+    async for message, _ in iter_history(client, chat_id, 30):
+        async for comment, comment_text in iter_replies(client, chat_id, message.id, 10):
+            if comment_text and reply_needle in comment_text:
+                result = comment
+                break
+        break
+    return result
+
+
+def run_job(loop, scan, client):
+    result = loop.run_until_complete(scan(client, 'bench_channel', NEEDLE))
+    # Let the loop finalize the generators the scan broke out of
+    loop.run_until_complete(asyncio.sleep(0))
+    return result
+
+
+def measure(loop, scan, client, jobs):
+    """Peak bytes of one job, and bytes still held by `jobs` finished jobs' results"""
+    run_job(loop, scan, client)  # warm-up: imports, caches
+    gc.collect()
+
+    tracemalloc.start()
+    baseline = tracemalloc.get_traced_memory()[0]
+    tracemalloc.reset_peak()
+    result = run_job(loop, scan, client)
+    peak = tracemalloc.get_traced_memory()[1] - baseline
+    assert result is not None, "duplicate not found"
+    del result
+
+    gc.collect()
+    baseline = tracemalloc.get_traced_memory()[0]
+    results = [run_job(loop, scan, client) for _ in range(jobs)]
+    gc.collect()
+    retained = tracemalloc.get_traced_memory()[0] - baseline
+    tracemalloc.stop()
+    del results
+    return peak, retained
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-job memory of the duplicate-comment scan")
+    parser.add_argument('--posts', type=int, default=30)
+    parser.add_argument('--comments', type=int, default=10)
+    parser.add_argument('--jobs', type=int, default=200, help="Finished jobs whose results are kept")
+    args = parser.parse_args()
+
+    random.seed(7)
+    history = history_page(args.posts)
+    client = BenchClient(history, replies_page(history.messages[0].id, args.comments))
+    loop = asyncio.new_event_loop()
+    try:
+        before_peak, before_retained = measure(loop, scan_before, client, args.jobs)
+        after_peak, after_retained = measure(loop, scan_after, client, args.jobs)
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+    print(f"🧪 Duplicate scan, {args.posts} posts x {args.comments} comments")
+    print(f"   per-job peak       before: {before_peak / 1024:8.1f} KB   after: {after_peak / 1024:8.1f} KB"
+          f"   ({before_peak / max(after_peak, 1):.1f}x less)")
+    print(f"   held by {args.jobs} jobs  before: {before_retained / 1024:8.1f} KB   after: {after_retained / 1024:8.1f} KB")
+
+
+if __name__ == "__main__":
+    main()
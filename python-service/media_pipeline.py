@@ -0,0 +1,420 @@
+"""
+Media Pipeline
+Validates and probes media files locally once (cached by path, size and mtime),
+then uploads videos in parallel 512 KB parts that survive failures: the parts
+already accepted by Telegram are persisted, so the next attempt only sends the
+missing ones. Memory is bounded to one part per upload worker.
+"""
+import asyncio
+import hashlib
+import json
+import math
+import mimetypes
+import os
+import shutil
+import sqlite3
+import subprocess
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+
+from logger_config import logger
+
+PART_SIZE = 512 * 1024
+BIG_FILE_THRESHOLD = 10 * 1024 * 1024
+PHOTO_MAX_BYTES = 10 * 1024 * 1024
+PHOTO_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.gif', '.webp'}
+VIDEO_EXTENSIONS = {'.mp4', '.mov', '.mkv', '.webm', '.avi', '.m4v'}
+THUMB_SIZE = 320
+THUMB_MAX_BYTES = 200 * 1024  # Telegram ignores larger thumbnails
+
+
+class MediaValidationError(ValueError):
+    """The file cannot be sent; raised before any byte is transferred"""
+
+
+def _default_cache_dir():
+    return Path(os.getenv('PYTHON_MEDIA_CACHE_DIR', Path(__file__).parent.parent / 'db' / 'media_cache'))
+
+
+class MediaStore:
+    """SQLite-backed cache of probed metadata and resumable upload state"""
+
+    def __init__(self, cache_dir=None):
+        self.cache_dir = Path(cache_dir) if cache_dir else _default_cache_dir()
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.cache_dir / 'media.db'
+        self._lock = threading.Lock()
+        with self._connect() as conn:
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS media_info (
+                    fingerprint TEXT PRIMARY KEY,
+                    info TEXT NOT NULL,
+                    probed_at REAL NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS uploads (
+                    upload_key TEXT PRIMARY KEY,
+                    file_id INTEGER NOT NULL,
+                    total_parts INTEGER NOT NULL,
+                    done BLOB NOT NULL,
+                    updated_at REAL NOT NULL
+                );
+            """)
+
+    def _connect(self):
+        return sqlite3.connect(self.db_path, timeout=10)
+
+    def get_info(self, fingerprint):
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT info FROM media_info WHERE fingerprint = ?", (fingerprint,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def put_info(self, fingerprint, info):
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO media_info VALUES (?, ?, ?)",
+                         (fingerprint, json.dumps(info), time.time()))
+
+    def get_upload(self, upload_key, max_age):
+        with self._lock, self._connect() as conn:
+            row = conn.execute("SELECT file_id, total_parts, done, updated_at FROM uploads WHERE upload_key = ?",
+                               (upload_key,)).fetchone()
+        if row is None or time.time() - row[3] > max_age:
+            return None
+        return row[0], row[1], bytearray(row[2])
+
+    def put_upload(self, upload_key, file_id, total_parts, done):
+        with self._lock, self._connect() as conn:
+            conn.execute("INSERT OR REPLACE INTO uploads VALUES (?, ?, ?, ?, ?)",
+                         (upload_key, file_id, total_parts, bytes(done), time.time()))
+
+    def delete_upload(self, upload_key):
+        with self._lock, self._connect() as conn:
+            conn.execute("DELETE FROM uploads WHERE upload_key = ?", (upload_key,))
+
+
+# ---------------------------------------------------------------------------
+# Validation & probing
+# ---------------------------------------------------------------------------
+
+def _fingerprint(path, stat):
+    return f"{os.path.abspath(path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+
+def _ffprobe(path):
+    """Return (duration, width, height) using ffprobe when it is installed"""
+    if not shutil.which('ffprobe'):
+        return 0, 0, 0
+    try:
+        output = subprocess.run(
+            ['ffprobe', '-v', 'error', '-select_streams', 'v:0',
+             '-show_entries', 'stream=width,height,duration:format=duration', '-of', 'json', str(path)],
+            capture_output=True, text=True, timeout=30, check=True).stdout
+        data = json.loads(output or '{}')
+    except (subprocess.SubprocessError, ValueError) as e:
+        raise MediaValidationError(f"Unreadable video file {path}: {e}")
+
+    streams = data.get('streams') or []
+    if not streams:
+        raise MediaValidationError(f"No video stream found in {path}")
+    stream = streams[0]
+    duration = stream.get('duration') or (data.get('format') or {}).get('duration') or 0
+    return int(float(duration)), int(stream.get('width') or 0), int(stream.get('height') or 0)
+
+
+def _make_thumbnail(path, cache_dir, fingerprint_hash):
+    """Extract a JPEG thumbnail (both sides <= THUMB_SIZE) with ffmpeg when it is installed"""
+    if not shutil.which('ffmpeg'):
+        return None
+    thumb_path = cache_dir / f"thumb-{fingerprint_hash}.jpg"
+    if thumb_path.exists():
+        return str(thumb_path)
+    try:
+        subprocess.run(
+            ['ffmpeg', '-y', '-v', 'error', '-ss', '1', '-i', str(path), '-frames:v', '1',
+             '-vf', f"scale={THUMB_SIZE}:{THUMB_SIZE}:force_original_aspect_ratio=decrease",
+             '-q:v', '5', str(thumb_path)],
+            capture_output=True, timeout=60, check=True)
+    except subprocess.SubprocessError as e:
+        logger.warning(f"⚠️ Thumbnail extraction failed for {path}: {e}")
+        return None
+    if not thumb_path.exists():
+        return None
+    if thumb_path.stat().st_size > THUMB_MAX_BYTES:
+        logger.warning(f"⚠️ Thumbnail for {path} is {thumb_path.stat().st_size} bytes, sending without one")
+        thumb_path.unlink()
+        return None
+    return str(thumb_path)
+
+
+def trace_info(info):
+    """Probed metadata without local paths, as kept in traffic traces"""
+    return {**info, 'path': None, 'thumb': None}
+
+
+class MediaPipeline:
+    def __init__(self, store=None, max_video_bytes=None, workers=None, resume_ttl=None):
+        self.store = store or MediaStore()
+        self.max_video_bytes = max_video_bytes or int(os.getenv('PYTHON_MEDIA_MAX_BYTES', str(2000 * 1024 * 1024)))
+        self.workers = workers or int(os.getenv('PYTHON_UPLOAD_WORKERS', '4'))
+        self.resume_ttl = resume_ttl or float(os.getenv('PYTHON_UPLOAD_RESUME_TTL', '3600'))
+        self.progress = UploadProgress()
+
+    def probe(self, path, message_type):
+        """Validate the file and return its cached metadata; raises MediaValidationError"""
+        try:
+            stat = os.stat(path)
+        except OSError as e:
+            raise MediaValidationError(f"Media file not accessible: {path} ({e.strerror})")
+        if not os.path.isfile(path) or not os.access(path, os.R_OK):
+            raise MediaValidationError(f"Media file is not a readable file: {path}")
+        if stat.st_size == 0:
+            raise MediaValidationError(f"Media file is empty: {path}")
+
+        fingerprint = _fingerprint(path, stat)
+        cached = self.store.get_info(fingerprint)
+        if cached:
+            return cached
+
+        ext = os.path.splitext(path)[1].lower()
+        kind = 'photo' if message_type == 'photo' or ext in PHOTO_EXTENSIONS else 'video'
+        info = {
+            'path': os.path.abspath(path),
+            'kind': kind,
+            'size': stat.st_size,
+            'mime_type': mimetypes.guess_type(path)[0] or ('image/jpeg' if kind == 'photo' else 'video/mp4'),
+            'duration': 0,
+            'width': 0,
+            'height': 0,
+            'thumb': None,
+        }
+
+        if kind == 'photo':
+            if ext not in PHOTO_EXTENSIONS:
+                raise MediaValidationError(f"Unsupported photo type '{ext}': {path}")
+            if stat.st_size > PHOTO_MAX_BYTES:
+                raise MediaValidationError(f"Photo is {stat.st_size} bytes, limit is {PHOTO_MAX_BYTES}: {path}")
+        else:
+            if ext not in VIDEO_EXTENSIONS:
+                raise MediaValidationError(f"Unsupported video type '{ext}': {path}")
+            if stat.st_size > self.max_video_bytes:
+                raise MediaValidationError(f"Video is {stat.st_size} bytes, limit is {self.max_video_bytes}: {path}")
+            info['duration'], info['width'], info['height'] = _ffprobe(path)
+            info['thumb'] = _make_thumbnail(path, self.store.cache_dir, hashlib.sha1(fingerprint.encode()).hexdigest()[:16])
+
+        self.store.put_info(fingerprint, info)
+        logger.debug(f"🎞️ Probed media {path}: {info}")
+        return info
+
+    # -----------------------------------------------------------------------
+    # Resumable upload
+    # -----------------------------------------------------------------------
+
+    async def upload(self, client, info, owner, job_id=None):
+        """Upload the file in parallel parts, resuming from persisted state.
+
+        Upload state is keyed by `owner` (the session key) and the file's
+        path:size:mtime fingerprint, so a file replaced in place starts over.
+        Returns a raw InputFile/InputFileBig usable in InputMediaUploadedDocument.
+        """
+        from pyrogram import errors, raw
+        from pyrogram.session import Session
+
+        path = info['path']
+        stat = os.stat(path)
+        file_size = stat.st_size
+        upload_key = f"{owner}:{_fingerprint(path, stat)}"
+        total_parts = int(math.ceil(file_size / PART_SIZE))
+        is_big = file_size > BIG_FILE_THRESHOLD
+
+        state = self.store.get_upload(upload_key, self.resume_ttl)
+        if state and state[1] == total_parts:
+            file_id, _, done = state
+        else:
+            file_id, done = client.rnd_id(), bytearray(total_parts)
+        missing = [part for part in range(total_parts) if not done[part]]
+        resumed_parts = total_parts - len(missing)
+        if resumed_parts:
+            logger.info(f"⏯️ Resuming upload of {path}: {resumed_parts}/{total_parts} parts already uploaded")
+
+        progress = self.progress.start(job_id, path, file_size, total_parts, resumed_parts)
+        queue = asyncio.Queue()
+        for part in missing:
+            queue.put_nowait(part)
+
+        session = Session(client, await client.storage.dc_id(), await client.storage.auth_key(),
+                          await client.storage.test_mode(), is_media=True)
+        session_started = False
+        last_saved = time.monotonic()
+
+        async def worker():
+            nonlocal last_saved
+            with open(path, 'rb') as f:
+                while True:
+                    try:
+                        part = queue.get_nowait()
+                    except asyncio.QueueEmpty:
+                        return
+                    f.seek(part * PART_SIZE)
+                    chunk = f.read(PART_SIZE)
+                    if is_big:
+                        rpc = raw.functions.upload.SaveBigFilePart(
+                            file_id=file_id, file_part=part, file_total_parts=total_parts, bytes=chunk)
+                    else:
+                        rpc = raw.functions.upload.SaveFilePart(file_id=file_id, file_part=part, bytes=chunk)
+
+                    for attempt in range(3):
+                        try:
+                            await session.invoke(rpc)
+                            break
+                        except errors.FloodWait as e:
+                            logger.warning(f"⏳ FloodWait {e.value}s while uploading part {part} of {path}")
+                            await asyncio.sleep(e.value)
+                        except (OSError, errors.RPCError):
+                            if attempt == 2:
+                                raise
+                            await asyncio.sleep(2 ** attempt)
+                    else:
+                        raise RuntimeError(f"Upload of part {part} of {path} kept hitting FloodWait")
+                    del chunk, rpc
+
+                    done[part] = 1
+                    progress.part_done()
+                    if time.monotonic() - last_saved > 2:
+                        last_saved = time.monotonic()
+                        self.store.put_upload(upload_key, file_id, total_parts, done)
+
+        try:
+            await session.start()
+            session_started = True
+            results = await asyncio.gather(*[worker() for _ in range(min(self.workers if is_big else 1, len(missing) or 1))],
+                                           return_exceptions=True)
+            failures = [result for result in results if isinstance(result, BaseException)]
+            if failures:
+                raise failures[0]
+        except BaseException:
+            self.store.put_upload(upload_key, file_id, total_parts, done)
+            progress.finish('failed')
+            raise
+        finally:
+            if session_started:
+                await session.stop()
+
+        self.store.delete_upload(upload_key)
+        progress.finish('uploaded')
+        name = os.path.basename(path)
+        if is_big:
+            return raw.types.InputFileBig(id=file_id, parts=total_parts, name=name)
+        return raw.types.InputFile(id=file_id, parts=total_parts, name=name, md5_checksum='')
+
+    async def reply_video(self, client, message, info, caption, owner, job_id=None):
+        """Reply to `message` with the video in `info`, like Message.reply_video()"""
+        from pyrogram import raw, types, utils
+
+        file = await self.upload(client, info, owner, job_id)
+        thumb = await client.save_file(info['thumb']) if info.get('thumb') else None
+
+        media = raw.types.InputMediaUploadedDocument(
+            mime_type=info['mime_type'],
+            file=file,
+            thumb=thumb,
+            attributes=[
+                raw.types.DocumentAttributeVideo(
+                    supports_streaming=True,
+                    duration=info['duration'],
+                    w=info['width'],
+                    h=info['height']
+                ),
+                raw.types.DocumentAttributeFilename(file_name=os.path.basename(info['path']))
+            ]
+        )
+
+        r = await client.invoke(
+            raw.functions.messages.SendMedia(
+                peer=await client.resolve_peer(message.chat.id),
+                media=media,
+                reply_to_msg_id=message.id,
+                random_id=client.rnd_id(),
+                **await utils.parse_text_entities(client, caption, None, None)
+            )
+        )
+
+        for update in r.updates:
+            if isinstance(update, (raw.types.UpdateNewMessage, raw.types.UpdateNewChannelMessage)):
+                return await types.Message._parse(
+                    client, update.message,
+                    {user.id: user for user in r.users},
+                    {chat.id: chat for chat in r.chats}
+                )
+        raise RuntimeError("SendMedia returned no message")
+
+
+class JobProgress:
+    def __init__(self, job_id, path, file_size, total_parts, resumed_parts):
+        self.job_id = job_id
+        self.path = path
+        self.file_size = file_size
+        self.total_parts = total_parts
+        self.resumed_parts = resumed_parts
+        self.parts_done = resumed_parts
+        self.state = 'uploading'
+        self.started_at = time.time()
+        self.updated_at = self.started_at
+        self._last_logged_pct = -10
+
+    def part_done(self):
+        self.parts_done += 1
+        self.updated_at = time.time()
+        pct = int(self.parts_done * 100 / self.total_parts)
+        if pct >= self._last_logged_pct + 10:
+            self._last_logged_pct = pct
+            logger.info(f"📤 Upload progress job={self.job_id}: {pct}% ({self.parts_done}/{self.total_parts} parts)",
+                        extra={'operation': 'upload_progress', 'jobId': self.job_id,
+                               'percent': pct, 'partsDone': self.parts_done, 'partsTotal': self.total_parts})
+
+    def finish(self, state):
+        self.state = state
+        self.updated_at = time.time()
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'file': os.path.basename(self.path),
+            'state': self.state,
+            'bytes_total': self.file_size,
+            'bytes_uploaded': min(self.parts_done * PART_SIZE, self.file_size),
+            'parts_done': self.parts_done,
+            'parts_total': self.total_parts,
+            'resumed_parts': self.resumed_parts,
+            'percent': round(self.parts_done * 100 / self.total_parts, 1) if self.total_parts else 100.0,
+            'started_at': self.started_at,
+            'updated_at': self.updated_at,
+        }
+
+
+class UploadProgress:
+    """Progress of recent uploads keyed by job id (bounded)"""
+
+    def __init__(self, max_jobs=256):
+        self.max_jobs = max_jobs
+        self._lock = threading.Lock()
+        self._jobs = OrderedDict()
+
+    def start(self, job_id, path, file_size, total_parts, resumed_parts):
+        progress = JobProgress(job_id, path, file_size, total_parts, resumed_parts)
+        if job_id is not None:
+            with self._lock:
+                self._jobs[str(job_id)] = progress
+                self._jobs.move_to_end(str(job_id))
+                while len(self._jobs) > self.max_jobs:
+                    self._jobs.popitem(last=False)
+        return progress
+
+    def get(self, job_id):
+        with self._lock:
+            progress = self._jobs.get(str(job_id))
+        return progress.to_dict() if progress else None
+
+    def active(self):
+        with self._lock:
+            return [progress.to_dict() for progress in self._jobs.values() if progress.state == 'uploading']
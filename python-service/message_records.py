@@ -0,0 +1,139 @@
+"""
+Projected Message Records
+Compact stand-ins for Pyrogram Message objects used while scanning channel
+history for duplicate comments. Raw history/replies pages are projected
+straight into __slots__ records (id, chat id, date, reply count) and dropped,
+so no Message/Chat/User/media objects are built. The normalized text is
+yielded next to each record for the substring check and not kept.
+"""
+from datetime import datetime
+
+import telegram_trace
+
+
+def normalize_text(text):
+    """Normalization used by the duplicate checks"""
+    return text.strip().lower() if text else ''
+
+
+class MessageRecord:
+    """Just enough of a message to pick a post and report a duplicate"""
+
+    __slots__ = ('id', 'chat_id', 'date', 'reply_count')
+
+    def __init__(self, id, chat_id, date, reply_count):
+        self.id = id
+        self.chat_id = chat_id
+        self.date = date  # unix timestamp (int) or None
+        self.reply_count = reply_count
+
+    def date_isoformat(self):
+        """Same format as Message.date.isoformat() (Pyrogram dates are local, naive)"""
+        return datetime.fromtimestamp(self.date).isoformat() if self.date else None
+
+    def __repr__(self):
+        return f"MessageRecord(id={self.id}, chat_id={self.chat_id}, date={self.date}, reply_count={self.reply_count})"
+
+
+def _reply_count(replies):
+    if replies is None:
+        return 0
+    if isinstance(replies, int):
+        return replies
+    return getattr(replies, 'replies', 0) or 0
+
+
+def project_raw(message):
+    """Project a raw TL message (raw.types.Message/MessageService/MessageEmpty)"""
+    from pyrogram import utils
+
+    peer = getattr(message, 'peer_id', None)
+    return MessageRecord(
+        id=message.id,
+        chat_id=utils.get_peer_id(peer) if peer is not None else None,
+        date=getattr(message, 'date', None) or None,
+        reply_count=_reply_count(getattr(message, 'replies', None)),
+    )
+
+
+def project_message(message):
+    """Project a parsed Pyrogram Message (or a replay stand-in)"""
+    date = getattr(message, 'date', None)
+    chat = getattr(message, 'chat', None)
+    return MessageRecord(
+        id=message.id,
+        chat_id=chat.id if chat is not None else None,
+        date=int(date.timestamp()) if date else None,
+        reply_count=_reply_count(getattr(message, 'replies', None)),
+    )
+
+
+async def _raw_history(client, chat_id, limit):
+    """Yield (record, normalized text) for the latest `limit` posts using raw GetHistory"""
+    from pyrogram import raw
+
+    r = await client.invoke(
+        raw.functions.messages.GetHistory(
+            peer=await client.resolve_peer(chat_id),
+            offset_id=0, offset_date=0, add_offset=0,
+            limit=limit, max_id=0, min_id=0, hash=0
+        ),
+        sleep_threshold=60
+    )
+    messages, r = r.messages, None
+    while messages:
+        message = messages.pop(0)
+        normalized = normalize_text(getattr(message, 'message', None))
+        yield project_raw(message), normalized
+        del message
+
+
+async def _raw_replies(client, chat_id, message_id, limit):
+    """Yield (record, normalized text) for the first `limit` comments using raw GetReplies"""
+    from pyrogram import raw
+
+    r = await client.invoke(
+        raw.functions.messages.GetReplies(
+            peer=await client.resolve_peer(chat_id),
+            msg_id=message_id,
+            offset_id=0, offset_date=0, add_offset=0,
+            limit=limit, max_id=0, min_id=0, hash=0
+        )
+    )
+    messages, r = r.messages, None
+    while messages:
+        message = messages.pop(0)
+        normalized = normalize_text(getattr(message, 'message', None))
+        yield project_raw(message), normalized
+        del message
+
+
+async def _client_history(client, chat_id, limit):
+    async for message in client.get_chat_history(chat_id=chat_id, limit=limit):
+        normalized = normalize_text(message.text if message.text else message.caption)
+        yield project_message(message), normalized
+
+
+async def _client_replies(client, chat_id, message_id, limit):
+    async for comment in client.get_discussion_replies(chat_id=chat_id, message_id=message_id, limit=limit):
+        normalized = normalize_text(comment.text if comment.text else comment.caption)
+        yield project_message(comment), normalized
+
+
+def iter_history(client, chat_id, limit):
+    """History as (record, normalized text) pairs.
+
+    Uses raw pages when talking to Telegram directly; while a record/replay
+    trace is active it goes through the client methods so traces see the
+    same get_chat_history/get_discussion_replies calls.
+    """
+    if telegram_trace.current_trace() is None:
+        return _raw_history(client, chat_id, limit)
+    return _client_history(client, chat_id, limit)
+
+
+def iter_replies(client, chat_id, message_id, limit):
+    """Discussion replies as (record, normalized text) pairs, see iter_history()"""
+    if telegram_trace.current_trace() is None:
+        return _raw_replies(client, chat_id, message_id, limit)
+    return _client_replies(client, chat_id, message_id, limit)
@@ -0,0 +1,210 @@
+"""
+Sampling Profiler for the Running Service
+Samples thread stacks with sys._current_frames(), so it sees every thread
+(request threads running their asyncio loop, Pyrogram workers, ...) without
+restarting the process or installing a tracing hook.
+"""
+import marshal
+import os
+import sys
+import threading
+import time
+from collections import Counter, deque
+from pathlib import Path
+
+MAX_STACK_DEPTH = 128
+
+
+def default_profile_dir():
+    """Directory for automatically dumped profiles (next to the logs)"""
+    profile_dir = os.getenv('PYTHON_PROFILE_DIR')
+    if profile_dir:
+        return Path(profile_dir)
+    log_dir = Path(os.getenv('LOG_DIR', '../logs'))
+    if not log_dir.is_absolute():
+        log_dir = Path(__file__).parent.parent / log_dir
+    return log_dir / 'profiles'
+
+
+def _frame_stack(frame):
+    """Return the stack as a root-first tuple of (filename, firstlineno, lineno, funcname)"""
+    stack = []
+    while frame is not None and len(stack) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        stack.append((code.co_filename, code.co_firstlineno, frame.f_lineno, code.co_name))
+        frame = frame.f_back
+    stack.reverse()
+    return tuple(stack)
+
+
+def _thread_names():
+    return {thread.ident: thread.name for thread in threading.enumerate()}
+
+
+class Profile:
+    """Aggregated samples: (thread name, stack) -> count"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.samples = Counter()
+        self.started_at = time.time()
+        self.duration = 0.0
+
+    def add(self, thread_name, stack):
+        if stack:
+            self.samples[(thread_name, stack)] += 1
+
+    @property
+    def total_samples(self):
+        return sum(self.samples.values())
+
+    def to_collapsed(self):
+        """Brendan Gregg's collapsed-stack format, ready for flamegraph.pl / speedscope"""
+        lines = []
+        for (thread_name, stack), count in self.samples.most_common():
+            frames = [f"thread:{thread_name}"]
+            frames.extend(
+                f"{funcname} ({os.path.basename(filename)}:{lineno})"
+                for filename, _, lineno, funcname in stack
+            )
+            lines.append(f"{';'.join(frames).replace(' ', '_')} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def to_pstats(self):
+        """Marshal data loadable with pstats.Stats, derived from the samples.
+
+        Call counts are sample counts; times are samples * interval.
+        """
+        stats = {}
+
+        def entry(func):
+            if func not in stats:
+                stats[func] = [0, 0, 0.0, 0.0, {}]
+            return stats[func]
+
+        for (_, stack), count in self.samples.items():
+            weight = count * self.interval
+            funcs = [(filename, firstlineno, funcname) for filename, firstlineno, _, funcname in stack]
+
+            # Self time goes to the innermost frame
+            leaf = entry(funcs[-1])
+            leaf[2] += weight
+
+            # Inclusive time once per function per sample (recursion-safe)
+            seen = set()
+            for index, func in enumerate(funcs):
+                record = entry(func)
+                if func not in seen:
+                    seen.add(func)
+                    record[0] += count
+                    record[1] += count
+                    record[3] += weight
+                if index > 0:
+                    caller = funcs[index - 1]
+                    cc, nc, tt, ct = record[4].get(caller, (0, 0, 0.0, 0.0))
+                    record[4][caller] = (cc + count, nc + count, tt, ct + weight)
+
+        data = {func: (cc, nc, tt, ct, callers) for func, (cc, nc, tt, ct, callers) in stats.items()}
+        return marshal.dumps(data)
+
+    def render(self, fmt):
+        """Return (bytes, filename, mimetype) for the requested output format"""
+        stamp = time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))
+        if fmt == 'pstats':
+            return self.to_pstats(), f"profile-{stamp}.pstats", 'application/octet-stream'
+        return self.to_collapsed().encode('utf-8'), f"profile-{stamp}.collapsed", 'text/plain'
+
+
+def profile_process(seconds, interval=0.01):
+    """Sample every thread of this process for `seconds` and return a Profile"""
+    profile = Profile(interval)
+    own_ident = threading.get_ident()
+    deadline = time.monotonic() + seconds
+    names = _thread_names()
+
+    while time.monotonic() < deadline:
+        frames = sys._current_frames()
+        if len(frames) != len(names):
+            names = _thread_names()
+        for ident, frame in frames.items():
+            if ident != own_ident:
+                profile.add(names.get(ident, str(ident)), _frame_stack(frame))
+        del frames
+        time.sleep(interval)
+
+    profile.duration = seconds
+    return profile
+
+
+class SlowRequestProfiler:
+    """Continuously samples threads that are serving a request and dumps the
+    samples of any request that exceeds the threshold to a collapsed-stack file.
+    """
+
+    def __init__(self, threshold_ms, interval=0.01, output_dir=None, max_samples=10000):
+        self.threshold = threshold_ms / 1000.0
+        self.interval = interval
+        self.output_dir = Path(output_dir) if output_dir else default_profile_dir()
+        self.max_samples = max_samples
+
+        self._lock = threading.Lock()
+        self._active = {}  # thread ident -> deque of stacks
+        self._thread = None
+
+    @classmethod
+    def from_env(cls):
+        """Return a profiler if PYTHON_SLOW_REQUEST_MS is set, else None"""
+        threshold_ms = int(os.getenv('PYTHON_SLOW_REQUEST_MS', '0'))
+        if threshold_ms <= 0:
+            return None
+        interval = float(os.getenv('PYTHON_PROFILE_INTERVAL_MS', '10')) / 1000.0
+        return cls(threshold_ms, interval=interval)
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="slow-request-profiler", daemon=True)
+            self._thread.start()
+        return self
+
+    def _run(self):
+        while True:
+            with self._lock:
+                idents = list(self._active)
+            if idents:
+                frames = sys._current_frames()
+                with self._lock:
+                    for ident in idents:
+                        buffer = self._active.get(ident)
+                        frame = frames.get(ident)
+                        if buffer is not None and frame is not None:
+                            buffer.append(_frame_stack(frame))
+                del frames
+            time.sleep(self.interval)
+
+    def begin(self):
+        """Start collecting samples for the current thread's request"""
+        with self._lock:
+            self._active[threading.get_ident()] = deque(maxlen=self.max_samples)
+        return time.monotonic()
+
+    def end(self, started_at, label):
+        """Stop collecting; dump a profile if the request was slow. Returns the path or None."""
+        with self._lock:
+            buffer = self._active.pop(threading.get_ident(), None)
+
+        duration = time.monotonic() - started_at
+        if buffer is None or duration < self.threshold:
+            return None
+
+        profile = Profile(self.interval)
+        profile.duration = duration
+        thread_name = threading.current_thread().name
+        for stack in buffer:
+            profile.add(thread_name, stack)
+
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        safe_label = ''.join(ch if ch.isalnum() else '_' for ch in label).strip('_') or 'request'
+        path = self.output_dir / f"slow-{time.strftime('%Y%m%d-%H%M%S')}-{safe_label}-{int(duration * 1000)}ms.collapsed"
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(profile.to_collapsed())
+        return path
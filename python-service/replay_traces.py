@@ -0,0 +1,185 @@
+"""
+Telegram Trace Replay Driver
+Feeds traces recorded with PYTHON_TRACE_RECORD through the service handlers
+offline, faster or slower than real time, for capacity planning and A/B runs.
+
+Usage:
+    python replay_traces.py traces.jsonl.gz --speed 4 --concurrency 32
+    python replay_traces.py traces.jsonl.gz --output after.json --compare before.json
+"""
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+
+# Replaying must never record again or touch the real log files by default
+os.environ.pop('PYTHON_TRACE_RECORD', None)
+os.environ.setdefault('LOG_TO_FILE', 'false')
+os.environ.setdefault('PYTHON_LOG_LEVEL', 'error')
+
+from app import app
+from telegram_trace import ReplayTrace, load_traces
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+    return round(ordered[index], 1)
+
+
+def latency_summary(values):
+    return {
+        'p50': percentile(values, 50),
+        'p95': percentile(values, 95),
+        'p99': percentile(values, 99),
+        'max': round(max(values), 1) if values else None,
+    }
+
+
+def replay_one(client, record, speed):
+    """Replay a single trace through its handler; returns the outcome"""
+    trace = ReplayTrace(record, speed=speed)
+    token = trace.activate()
+    started = time.monotonic()
+    try:
+        payload = dict(record.get('request') or {})
+        payload['session_string'] = f"replay:{record.get('session', 'anonymous')}"
+        response = client.post(record['endpoint'], json=payload)
+        status = response.status_code
+    finally:
+        ReplayTrace.deactivate(token)
+    return {
+        'endpoint': record['endpoint'],
+        'status': status,
+        'recorded_status': record.get('status'),
+        'ms': (time.monotonic() - started) * 1000,
+        'recorded_ms': record.get('ms', 0),
+        'unmatched': trace.unmatched,
+    }
+
+
+def run_replay(path, speed=1.0, concurrency=16, arrival='recorded', limit=None):
+    records = list(load_traces(path))
+    if limit:
+        records = records[:limit]
+    records.sort(key=lambda record: record.get('started_at', 0))
+
+    results = []
+    results_lock = threading.Lock()
+    client = app.test_client()
+
+    def task(record):
+        outcome = replay_one(client, record, speed)
+        with results_lock:
+            results.append(outcome)
+
+    wall_started = time.monotonic()
+    first_at = records[0].get('started_at', 0) if records else 0
+    futures = []
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for record in records:
+            if arrival == 'recorded' and speed > 0:
+                due = (record.get('started_at', 0) - first_at) / speed
+                delay = due - (time.monotonic() - wall_started)
+                if delay > 0:
+                    time.sleep(delay)
+            futures.append((record, pool.submit(task, record)))
+    wall_seconds = time.monotonic() - wall_started
+
+    # A replay that raised (e.g. a malformed trace) is reported, not silently dropped
+    failures = []
+    for record, future in futures:
+        try:
+            future.result()
+        except Exception as e:
+            failures.append({'endpoint': record.get('endpoint'), 'error': f"{type(e).__name__}: {e}"})
+
+    return summarize(results, failures, wall_seconds, speed, arrival)
+
+
+def summarize(results, failures, wall_seconds, speed, arrival):
+    by_endpoint = {}
+    for endpoint in sorted({result['endpoint'] for result in results}):
+        subset = [result for result in results if result['endpoint'] == endpoint]
+        by_endpoint[endpoint] = {
+            'requests': len(subset),
+            'status': dict(Counter(str(result['status']) for result in subset)),
+            'status_changed': sum(1 for result in subset if result['status'] != result['recorded_status']),
+            'replayed_ms': latency_summary([result['ms'] for result in subset]),
+            'recorded_ms': latency_summary([result['recorded_ms'] for result in subset]),
+        }
+    return {
+        'requests': len(results),
+        'speed': speed,
+        'arrival': arrival,
+        'wall_seconds': round(wall_seconds, 2),
+        'throughput_rps': round(len(results) / wall_seconds, 2) if wall_seconds else None,
+        'rejected_429': sum(1 for result in results if result['status'] == 429),
+        'unmatched_calls': sum(result['unmatched'] for result in results),
+        'failed': len(failures),
+        'failures': failures,
+        'endpoints': by_endpoint,
+    }
+
+
+def print_summary(summary, baseline=None):
+    print(f"🔁 Replayed {summary['requests']} requests in {summary['wall_seconds']}s "
+          f"(speed={summary['speed']}, arrival={summary['arrival']}, {summary['throughput_rps']} req/s)")
+    print(f"   429 rejected: {summary['rejected_429']}, unmatched calls: {summary['unmatched_calls']}, "
+          f"failed replays: {summary['failed']}")
+    for failure in summary['failures']:
+        print(f"   ❌ {failure['endpoint']}: {failure['error']}")
+    for endpoint, stats in summary['endpoints'].items():
+        replayed = stats['replayed_ms']
+        recorded = stats['recorded_ms']
+        print(f"   {endpoint}: n={stats['requests']} status={stats['status']} changed={stats['status_changed']}")
+        print(f"      replayed p50={replayed['p50']}ms p95={replayed['p95']}ms max={replayed['max']}ms"
+              f" | recorded p50={recorded['p50']}ms p95={recorded['p95']}ms")
+        if baseline and endpoint in baseline.get('endpoints', {}):
+            before = baseline['endpoints'][endpoint]['replayed_ms']
+            for key in ('p50', 'p95'):
+                if before.get(key) and replayed.get(key) is not None:
+                    change = (replayed[key] - before[key]) / before[key] * 100
+                    print(f"      {key} vs baseline: {before[key]}ms -> {replayed[key]}ms ({change:+.1f}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded Telegram traces through the service handlers")
+    parser.add_argument('trace_file', help="Trace file written by PYTHON_TRACE_RECORD (.jsonl or .jsonl.gz)")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="Time scale: 2 = twice as fast, 0.5 = twice as slow, 0 = no delays")
+    parser.add_argument('--concurrency', type=int, default=16, help="Maximum concurrent replayed requests")
+    parser.add_argument('--arrival', choices=['recorded', 'burst'], default='recorded',
+                        help="Keep recorded inter-arrival gaps (scaled) or submit everything at once")
+    parser.add_argument('--limit', type=int, help="Replay only the first N traces")
+    parser.add_argument('--output', help="Write the JSON summary to this file")
+    parser.add_argument('--compare', help="Baseline summary JSON to compare against")
+    args = parser.parse_args()
+
+    if args.speed < 0:
+        parser.error("--speed must be >= 0")
+
+    summary = run_replay(args.trace_file, speed=args.speed, concurrency=args.concurrency,
+                         arrival=args.arrival, limit=args.limit)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print_summary(summary, baseline)
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(summary, f, indent=2)
+        print(f"📄 Summary written to {args.output}")
+    return 1 if summary['failed'] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,55 @@
+"""
+WSGI Serving
+Runs the Flask app on waitress, over TCP and optionally a Unix domain socket.
+Waitress keeps HTTP/1.1 connections open between requests; Werkzeug's
+development server sends `Connection: close` after every response, so the
+backend's keep-alive agent could never reuse a connection.
+"""
+import os
+import socket
+import stat
+
+from waitress.server import create_server
+
+
+def bind_unix_socket(path, mode=0o660):
+    """Bind a listening Unix socket at `path`.
+
+    A stale socket file left by a previous run is replaced. Anything else at
+    that path (a regular file, a directory, or a socket another process is
+    still serving) raises RuntimeError instead of being deleted.
+    """
+    try:
+        existing = os.stat(path)
+    except FileNotFoundError:
+        existing = None
+
+    if existing is not None:
+        if not stat.S_ISSOCK(existing.st_mode):
+            raise RuntimeError(f"{path} exists and is not a socket, refusing to replace it")
+        probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            probe.connect(path)
+        except OSError:
+            os.unlink(path)  # nobody is listening: stale socket from a previous run
+        else:
+            raise RuntimeError(f"{path} is in use by another process")
+        finally:
+            probe.close()
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.bind(path)
+        os.chmod(path, mode)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def create_tcp_server(app, host, port, threads):
+    return create_server(app, host=host, port=port, threads=threads, ident='python-service')
+
+
+def create_unix_server(app, socket_path, threads):
+    return create_server(app, sockets=[bind_unix_socket(socket_path)], threads=threads, ident='python-service')
@@ -0,0 +1,56 @@
+"""
+Session Handle Registry
+Lets callers register a session string once and refer to it by a short handle
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+
+class UnknownSessionHandle(KeyError):
+    """Raised when a handle is not (or no longer) registered"""
+
+
+class SessionRegistry:
+    """Bounded in-memory map of handle -> session string (LRU eviction)"""
+
+    def __init__(self, max_sessions=1024):
+        self.max_sessions = max_sessions
+        self._lock = threading.Lock()
+        self._sessions = OrderedDict()
+
+    @classmethod
+    def from_env(cls):
+        return cls(max_sessions=int(os.getenv('PYTHON_SESSION_REGISTRY_SIZE', '1024')))
+
+    @staticmethod
+    def handle_for(session_string):
+        """Deterministic handle so re-registering after a restart is idempotent"""
+        return 'sh_' + hashlib.sha256(session_string.encode('utf-8')).hexdigest()[:24]
+
+    def register(self, session_string):
+        handle = self.handle_for(session_string)
+        with self._lock:
+            self._sessions[handle] = session_string
+            self._sessions.move_to_end(handle)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+        return handle
+
+    def resolve(self, handle):
+        with self._lock:
+            try:
+                session_string = self._sessions[handle]
+            except KeyError:
+                raise UnknownSessionHandle(handle) from None
+            self._sessions.move_to_end(handle)
+            return session_string
+
+    def unregister(self, handle):
+        with self._lock:
+            return self._sessions.pop(handle, None) is not None
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
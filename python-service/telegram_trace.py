@@ -0,0 +1,454 @@
+"""
+Telegram Traffic Record & Replay
+Records every Pyrogram call a handler makes (timing, outcome, minimal payload)
+as one compact JSON line per request, and replays those traces offline through
+the same handlers with a fake client.
+"""
+import asyncio
+import builtins
+import contextvars
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from types import SimpleNamespace
+
+from admission import session_key
+
+# Pyrogram calls made by the handlers
+CLIENT_COROUTINES = {'start', 'stop', 'get_me', 'get_discussion_message'}
+CLIENT_GENERATORS = {'get_chat_history', 'get_discussion_replies'}
+MESSAGE_COROUTINES = {'reply', 'reply_photo', 'reply_video'}
+FILE_ARGS = {'photo', 'video', 'file'}
+TEXT_ARGS = {'text', 'caption'}
+POSITIONAL_ARGS = {'reply': ('text',), 'reply_photo': ('photo',), 'reply_video': ('video',),
+                   'probe_media': ('file', 'message_type')}
+
+# Active RecordingTrace or ReplayTrace for the current request
+_current_trace = contextvars.ContextVar('telegram_trace', default=None)
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def wrap_client(factory):
+    """Return a Pyrogram client, routed through the active trace if there is one.
+
+    `factory` creates the real client and is not called during replay.
+    """
+    trace = _current_trace.get()
+    if trace is None:
+        return factory()
+    return trace.client(factory)
+
+
+async def traced_call(op, func, *args, trace_args=None, **kwargs):
+    """Await func(*args, **kwargs) as a single traced operation.
+
+    For handler steps that drive the client at a lower level (e.g. the
+    resumable media upload): recorded as one `op` call, served from the trace
+    on replay without calling `func`. `trace_args` is recorded in place of the
+    real arguments, which are usually clients, messages and local keys.
+    """
+    trace = _current_trace.get()
+    if isinstance(trace, ReplayTrace):
+        return await trace.play(op)
+    if isinstance(trace, RecordingTrace):
+        return await _record_coroutine(trace, op, func, args, kwargs, None, trace_args or {})
+    return await func(*args, **kwargs)
+
+
+def traced_value(op, func, args, project, error_types=()):
+    """Call a synchronous local step (e.g. the media probe) as a traced operation.
+
+    The recording keeps project(result); replay returns that projection
+    without calling `func`, since the local files it inspects are not there
+    offline. Recorded errors whose type is in `error_types` are raised as
+    that type so the handler takes the same branch.
+    """
+    trace = _current_trace.get()
+    if isinstance(trace, ReplayTrace):
+        call = trace._next(op)
+        if 'error' in call:
+            error_class = {cls.__name__: cls for cls in error_types}.get(call['error']['type'])
+            if error_class is not None:
+                raise error_class(call['error'].get('message'))
+            raise _rebuild_error(call['error'])
+        return call.get('result')
+    if not isinstance(trace, RecordingTrace):
+        return func(*args)
+
+    call = trace.new_call(op, args, {})
+    started = time.monotonic()
+    try:
+        result = func(*args)
+    except Exception as e:
+        call['ms'] = _elapsed_ms(started)
+        call['error'] = _project_error(e)
+        raise
+    call['ms'] = _elapsed_ms(started)
+    call['result'] = project(result)
+    return result
+
+
+def _open_trace_file(path, mode):
+    if str(path).endswith('.gz'):
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+# ---------------------------------------------------------------------------
+# Projection of Pyrogram objects and arguments to minimal JSON payloads
+# ---------------------------------------------------------------------------
+
+def _project(obj):
+    """Keep only the fields the handlers read"""
+    if obj is None:
+        return None
+    if hasattr(obj, 'first_name') and not hasattr(obj, 'chat'):
+        return {
+            'id': obj.id,
+            'first_name': obj.first_name,
+            'last_name': obj.last_name,
+            'username': obj.username,
+            'phone_number': obj.phone_number,
+            'is_premium': obj.is_premium,
+        }
+    date = getattr(obj, 'date', None)
+    chat = getattr(obj, 'chat', None)
+    return {
+        'id': getattr(obj, 'id', None),
+        'date': date.isoformat() if date else None,
+        'text': getattr(obj, 'text', None),
+        'caption': getattr(obj, 'caption', None),
+        'chat_id': chat.id if chat is not None else None,
+    }
+
+
+def _project_value(key, value):
+    if key in FILE_ARGS and isinstance(value, str):
+        return {'file_size': os.path.getsize(value) if os.path.exists(value) else None}
+    if key in TEXT_ARGS and isinstance(value, str):
+        return {'length': len(value)}
+    if isinstance(value, (int, float, bool)) or value is None:
+        return value
+    if isinstance(value, str):
+        return value[:64]
+    return type(value).__name__
+
+
+def _project_args(op, args, kwargs):
+    names = POSITIONAL_ARGS.get(op, ())
+    projected = {}
+    for index, value in enumerate(args):
+        key = names[index] if index < len(names) else f'_{index}'
+        projected[key] = _project_value(key, value)
+    projected.update({key: _project_value(key, value) for key, value in kwargs.items()})
+    return projected
+
+
+def _project_error(error):
+    value = getattr(error, 'value', None)
+    return {
+        'type': type(error).__name__,
+        'value': value if isinstance(value, (int, str)) else None,
+        'message': str(error)[:200],
+    }
+
+
+def _elapsed_ms(since):
+    return round((time.monotonic() - since) * 1000, 1)
+
+
+# ---------------------------------------------------------------------------
+# Recording
+# ---------------------------------------------------------------------------
+
+class TraceRecorder:
+    """Appends one JSON line per recorded request to a (optionally gzipped) file"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Return a recorder if PYTHON_TRACE_RECORD is set, else None"""
+        path = os.getenv('PYTHON_TRACE_RECORD')
+        return cls(path) if path else None
+
+    def begin(self, endpoint, request_data):
+        """Start a trace for the current request; returns a token for finish()"""
+        request = {key: value for key, value in (request_data or {}).items()
+                   if key not in ('session_string', 'session_handle')}
+        session = session_key((request_data or {}).get('session_string')
+                              or (request_data or {}).get('session_handle'))
+        trace = RecordingTrace(endpoint, request, session)
+        return trace, _current_trace.set(trace)
+
+    def finish(self, token, status_code):
+        trace, context_token = token
+        _current_trace.reset(context_token)
+        record = trace.to_record(status_code)
+        line = json.dumps(record, separators=(',', ':'), default=str)
+        with self._lock:
+            with _open_trace_file(self.path, 'a') as f:
+                f.write(line + '\n')
+
+
+class RecordingTrace:
+    """Calls made while serving one request"""
+
+    def __init__(self, endpoint, request, session):
+        self.endpoint = endpoint
+        self.request = request
+        self.session = session
+        self.started_at = time.time()
+        self._started = time.monotonic()
+        self.calls = []
+
+    def client(self, factory):
+        return RecordingClient(factory(), self)
+
+    def new_call(self, op, args, kwargs, projected_args=None):
+        if projected_args is None:
+            projected_args = _project_args(op, args, kwargs)
+        call = {'op': op, 'at': _elapsed_ms(self._started), 'args': projected_args}
+        self.calls.append(call)
+        return call
+
+    def to_record(self, status_code):
+        return {
+            'endpoint': self.endpoint,
+            'started_at': round(self.started_at, 3),
+            'ms': _elapsed_ms(self._started),
+            'status': status_code,
+            'session': self.session,
+            'request': self.request,
+            'calls': self.calls,
+        }
+
+
+async def _record_coroutine(trace, op, method, args, kwargs, wrap_result, projected_args=None):
+    call = trace.new_call(op, args, kwargs, projected_args)
+    started = time.monotonic()
+    try:
+        result = await method(*args, **kwargs)
+    except Exception as e:
+        call['ms'] = _elapsed_ms(started)
+        call['error'] = _project_error(e)
+        raise
+    call['ms'] = _elapsed_ms(started)
+    call['result'] = _project(result)
+    return wrap_result(result) if wrap_result else result
+
+
+async def _record_generator(trace, op, method, args, kwargs):
+    """Record items and the time spent inside the generator only.
+
+    The handler does its own (recorded) calls between items, so that time is
+    excluded from `item_at` and `ms` to avoid counting it twice on replay.
+    """
+    call = trace.new_call(op, args, kwargs)
+    call['items'] = []
+    call['item_at'] = []
+    iterator = method(*args, **kwargs).__aiter__()
+    busy = 0.0
+    while True:
+        started = time.monotonic()
+        try:
+            item = await iterator.__anext__()
+        except StopAsyncIteration:
+            busy += time.monotonic() - started
+            break
+        except Exception as e:
+            busy += time.monotonic() - started
+            call['ms'] = round(busy * 1000, 1)
+            call['error'] = _project_error(e)
+            raise
+        busy += time.monotonic() - started
+        call['item_at'].append(round(busy * 1000, 1))
+        call['items'].append(_project(item))
+        call['ms'] = round(busy * 1000, 1)
+        yield item
+    call['ms'] = round(busy * 1000, 1)
+
+
+class RecordingMessage:
+    """Proxy for a Message whose reply methods are recorded"""
+
+    def __init__(self, message, trace):
+        self._message = message
+        self._trace = trace
+
+    def __getattr__(self, name):
+        attr = getattr(self._message, name)
+        if name in MESSAGE_COROUTINES:
+            return lambda *args, **kwargs: _record_coroutine(self._trace, name, attr, args, kwargs, None)
+        return attr
+
+
+class RecordingClient:
+    """Proxy for a Pyrogram Client whose handler-facing calls are recorded"""
+
+    def __init__(self, client, trace):
+        self._client = client
+        self._trace = trace
+
+    def __getattr__(self, name):
+        attr = getattr(self._client, name)
+        if name in CLIENT_GENERATORS:
+            return lambda *args, **kwargs: _record_generator(self._trace, name, attr, args, kwargs)
+        if name in CLIENT_COROUTINES:
+            wrap = (lambda message: RecordingMessage(message, self._trace)) if name == 'get_discussion_message' else None
+            return lambda *args, **kwargs: _record_coroutine(self._trace, name, attr, args, kwargs, wrap)
+        return attr
+
+
+# ---------------------------------------------------------------------------
+# Replay
+# ---------------------------------------------------------------------------
+
+class ReplayMismatch(Exception):
+    """The handler made a call that is not in the recorded trace"""
+
+
+def load_traces(path):
+    """Yield recorded traces from a trace file"""
+    with _open_trace_file(path, 'r') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def _rebuild_error(error):
+    """Re-create the recorded exception, using the Pyrogram or builtin class when available"""
+    try:
+        from pyrogram import errors
+        error_class = getattr(errors, error['type'], None)
+    except ImportError:
+        error_class = None
+
+    if isinstance(error_class, type) and issubclass(error_class, Exception):
+        try:
+            return error_class(value=error.get('value'))
+        except TypeError:
+            pass
+
+    builtin_class = getattr(builtins, error['type'], None)
+    if isinstance(builtin_class, type) and issubclass(builtin_class, Exception):
+        return builtin_class(error.get('message'))
+    return Exception(error.get('message') or error['type'])
+
+
+def _rebuild(obj, trace):
+    if obj is None:
+        return None
+    if 'first_name' in obj:
+        return SimpleNamespace(**obj)
+    return ReplayMessage(obj, trace)
+
+
+class ReplayMessage:
+    """Stand-in for a recorded Message"""
+
+    def __init__(self, data, trace):
+        self.id = data.get('id')
+        self.date = datetime.fromisoformat(data['date']) if data.get('date') else None
+        self.text = data.get('text')
+        self.caption = data.get('caption')
+        self.chat = SimpleNamespace(id=data.get('chat_id'))
+        self._trace = trace
+
+    async def reply(self, *args, **kwargs):
+        return await self._trace.play('reply')
+
+    async def reply_photo(self, *args, **kwargs):
+        return await self._trace.play('reply_photo')
+
+    async def reply_video(self, *args, **kwargs):
+        return await self._trace.play('reply_video')
+
+
+class ReplayClient:
+    """Fake Pyrogram Client answering from a recorded trace"""
+
+    def __init__(self, trace):
+        self._trace = trace
+
+    async def start(self):
+        return await self._trace.play('start')
+
+    async def stop(self):
+        return await self._trace.play('stop')
+
+    async def get_me(self):
+        return await self._trace.play('get_me')
+
+    async def get_discussion_message(self, *args, **kwargs):
+        return await self._trace.play('get_discussion_message')
+
+    def get_chat_history(self, *args, **kwargs):
+        return self._trace.play_items('get_chat_history')
+
+    def get_discussion_replies(self, *args, **kwargs):
+        return self._trace.play_items('get_discussion_replies')
+
+
+class ReplayTrace:
+    """Serves recorded calls in order per operation, scaled by `speed`.
+
+    speed=2 replays twice as fast as recorded, speed=0.5 twice as slow;
+    speed=0 skips all recorded delays.
+    """
+
+    def __init__(self, record, speed=1.0):
+        self.record = record
+        self.speed = speed
+        self.unmatched = 0
+        self._pending = {}
+        for call in record.get('calls', []):
+            self._pending.setdefault(call['op'], []).append(call)
+
+    def client(self, factory):
+        return ReplayClient(self)
+
+    def activate(self):
+        return _current_trace.set(self)
+
+    @staticmethod
+    def deactivate(token):
+        _current_trace.reset(token)
+
+    async def _sleep(self, ms):
+        if self.speed > 0 and ms:
+            await asyncio.sleep(ms / 1000.0 / self.speed)
+
+    def _next(self, op):
+        calls = self._pending.get(op)
+        if not calls:
+            self.unmatched += 1
+            raise ReplayMismatch(f"No recorded '{op}' call left in trace")
+        return calls.pop(0)
+
+    async def play(self, op):
+        call = self._next(op)
+        await self._sleep(call.get('ms', 0))
+        if 'error' in call:
+            raise _rebuild_error(call['error'])
+        return _rebuild(call.get('result'), self)
+
+    async def play_items(self, op):
+        call = self._next(op)
+        elapsed = 0.0
+        for item, at in zip(call.get('items', []), call.get('item_at', [])):
+            await self._sleep(at - elapsed)
+            elapsed = at
+            yield _rebuild(item, self)
+        await self._sleep(max(call.get('ms', 0) - elapsed, 0))
+        if 'error' in call:
+            raise _rebuild_error(call['error'])
@@ -0,0 +1,18 @@
+import importlib
+import os
+import sys
+
+import pytest
+
+# The service modules are flat files in python-service/, imported by name
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def service_app(tmp_path_factory):
+    """The Flask app module, with logs and the media cache kept out of the repo"""
+    os.environ['LOG_TO_FILE'] = 'false'
+    os.environ['PYTHON_LOG_LEVEL'] = 'error'
+    os.environ['PYTHON_MEDIA_CACHE_DIR'] = str(tmp_path_factory.mktemp('media_cache'))
+    os.environ.pop('PYTHON_TRACE_RECORD', None)
+    return importlib.import_module('app')
@@ -0,0 +1,83 @@
+import threading
+import time
+
+import pytest
+
+from admission import AdmissionController, AdmissionRejected, session_key
+
+
+def test_session_key_is_short_and_stable():
+    assert session_key("abc") == session_key("abc")
+    assert len(session_key("abc")) == 12
+    assert session_key("abc") != session_key("abd")
+    assert session_key(None) == "anonymous"
+
+
+def test_rejects_with_queue_full_when_no_queue():
+    controller = AdmissionController(max_inflight=1, max_per_session=1, max_queue=0, queue_timeout=5)
+    controller.acquire("a")
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire("b")
+
+    assert excinfo.value.reason == "queue_full"
+    assert controller.stats()["rejectedTotal"] == {"queue_full": 1, "queue_timeout": 0}
+
+
+def test_rejects_with_queue_timeout_when_slot_never_frees():
+    controller = AdmissionController(max_inflight=1, max_per_session=1, max_queue=4, queue_timeout=0.05)
+    controller.acquire("a")
+
+    started = time.monotonic()
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire("b")
+
+    assert excinfo.value.reason == "queue_timeout"
+    assert time.monotonic() - started >= 0.05
+    assert controller.stats()["queueDepth"] == 0
+
+
+def test_per_session_cap_does_not_block_other_sessions():
+    controller = AdmissionController(max_inflight=4, max_per_session=1, max_queue=4, queue_timeout=0.05)
+    controller.acquire("a")
+
+    with pytest.raises(AdmissionRejected):
+        controller.acquire("a")
+    controller.acquire("b")
+
+    stats = controller.stats()
+    assert stats["inflight"] == 2
+    assert stats["activeSessions"] == 2
+
+
+def test_waiter_is_admitted_after_release():
+    controller = AdmissionController(max_inflight=1, max_per_session=1, max_queue=4, queue_timeout=5)
+    started_at = controller.acquire("a")
+    admitted = threading.Event()
+
+    def waiter():
+        controller.acquire("b")
+        admitted.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    time.sleep(0.05)
+    assert not admitted.is_set()
+
+    controller.release("a", started_at)
+    thread.join(timeout=2)
+    assert admitted.is_set()
+    assert controller.stats()["inflight"] == 1
+
+
+def test_retry_after_follows_observed_duration():
+    controller = AdmissionController(max_inflight=1, max_per_session=1, max_queue=0, queue_timeout=5)
+    # One 10s operation: EWMA goes from 1.0 to 0.8 * 1.0 + 0.2 * 10 = 2.8s
+    controller.acquire("a")
+    controller.release("a", time.monotonic() - 10)
+    controller.acquire("a")
+
+    with pytest.raises(AdmissionRejected) as excinfo:
+        controller.acquire("b")
+
+    assert excinfo.value.retry_after == 3
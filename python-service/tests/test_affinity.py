@@ -0,0 +1,89 @@
+import math
+
+import pytest
+
+from affinity import AccountHealth, plan_assignments
+
+CHANNELS = [f"-100{i}" for i in range(200)]
+
+
+def test_assignment_is_deterministic_and_order_independent():
+    weights = {"a": 1.0, "b": 1.0, "c": 1.0}
+
+    first = plan_assignments(weights, CHANNELS)
+    second = plan_assignments(weights, list(reversed(CHANNELS)))
+
+    assert first == second
+    assert set(first) == set(CHANNELS)
+
+
+def moved_when_dropped(accounts, dropped, load_factor):
+    weights = dict.fromkeys(accounts, 1.0)
+    before = plan_assignments(weights, CHANNELS, load_factor=load_factor)
+    after = plan_assignments({**weights, dropped: 0.0}, CHANNELS, load_factor=load_factor)
+
+    assert dropped not in after.values()
+    moved = [channel for channel in CHANNELS if before[channel] != after[channel]]
+    assert moved
+    return [channel for channel in moved if before[channel] != dropped]
+
+
+@pytest.mark.parametrize("dropped", "abcdefgh")
+def test_only_dropped_accounts_channels_move_without_capping(dropped):
+    assert moved_when_dropped("abcdefgh", dropped, load_factor=100) == []
+
+
+@pytest.mark.parametrize("dropped", "abcdefgh")
+def test_capping_moves_few_other_channels(dropped):
+    # Survivors pushed over their cap pass some channels on: a handful, not a reshuffle
+    assert len(moved_when_dropped("abcdefgh", dropped, load_factor=1.25)) <= len(CHANNELS) // 20
+
+
+def test_capacity_caps_each_account_share():
+    load_factor = 1.25
+    weights = {"a": 1.0, "b": 1.0, "c": 1.0, "d": 1.0}
+
+    assignments = plan_assignments(weights, CHANNELS, load_factor=load_factor)
+
+    cap = math.ceil(len(CHANNELS) / len(weights) * load_factor)
+    for key in weights:
+        assert list(assignments.values()).count(key) <= cap
+
+
+def test_no_live_accounts_assigns_nothing():
+    assert plan_assignments({"a": 0.0}, CHANNELS) == {}
+    assert plan_assignments({"a": 1.0}, []) == {}
+
+
+def test_single_error_does_not_change_weight():
+    health = AccountHealth()
+    health.record_error("a")
+
+    assert health.weight("a") == (1.0, None)
+
+
+def test_repeated_errors_drop_a_band():
+    health = AccountHealth()
+    for _ in range(3):
+        health.record_error("a")
+
+    assert health.weight("a") == (0.5, None)
+
+
+def test_long_flood_wait_excludes_account():
+    health = AccountHealth(exclude_wait_seconds=60)
+    health.record_flood_wait("a", 300)
+
+    weight, reason = health.weight("a")
+    assert weight == 0.0
+    assert reason.startswith("flood_wait")
+
+
+def test_exhausted_flood_wait_budget_excludes_account():
+    health = AccountHealth(flood_budget_seconds=100, exclude_wait_seconds=60)
+    health.record_flood_wait("a", 50)
+    health.record_flood_wait("a", 50)
+
+    weight, reason = health.weight("a", now=health._accounts["a"]["flood_wait_until"] + 1)
+    assert weight == 0.0
+    assert reason.startswith("flood_wait_budget_exhausted")
@@ -0,0 +1,145 @@
+import json
+import os
+
+import pytest
+
+from analyze_logs import LogAnalyzer, rotation_family
+
+
+def winston(timestamp, message, meta, level="INFO"):
+    return f"{timestamp} [{level}] [backend] {message}\n{json.dumps(meta, indent=2)}\n"
+
+
+def job_started(job_id, timestamp="2026-10-19 10:00:00"):
+    return winston(timestamp, "Worker processing job",
+                   {"operation": "process_job", "jobId": job_id, "runId": "r1", "chatId": "c1"})
+
+
+def job_completed(job_id, duration_ms, timestamp="2026-10-19 10:00:05", skipped=False):
+    return winston(timestamp, "Worker job completed successfully",
+                   {"operation": "process_job", "jobId": job_id, "runId": "r1", "chatId": "c1",
+                    "durationMs": duration_ms, "skipped": skipped, "event": "job_completed"})
+
+
+@pytest.fixture
+def analyzer(tmp_path):
+    analyzer = LogAnalyzer(str(tmp_path / "rollup.db"))
+    yield analyzer
+    analyzer.close()
+
+
+def run_stats(analyzer):
+    rows = analyzer.summary("run")
+    return rows[0] if rows else None
+
+
+def test_rollup_counts_starts_completions_and_skips(tmp_path, analyzer):
+    log = tmp_path / "application.log"
+    log.write_text(job_started("1") + job_completed("1", 120)
+                   + job_started("2") + job_completed("2", 300, skipped=True))
+
+    records, _ = analyzer.update([str(log)])
+
+    stats = run_stats(analyzer)
+    assert records == 4
+    assert (stats["requests"], stats["completed"], stats["skipped"]) == (2, 2, 1)
+    assert stats["latency_max_ms"] == 300
+    assert analyzer.missing_completions_warning() is None
+
+
+def test_second_pass_reads_only_new_bytes(tmp_path, analyzer):
+    log = tmp_path / "application.log"
+    log.write_text(job_started("1") + job_completed("1", 120))
+    analyzer.update([str(log)])
+
+    assert analyzer.update([str(log)]) == (0, 0)
+    with open(log, "a") as f:
+        f.write(job_started("2") + job_completed("2", 80))
+    records, _ = analyzer.update([str(log)])
+
+    assert records == 2
+    assert run_stats(analyzer)["completed"] == 2
+
+
+def test_partial_winston_block_is_consumed_once_complete(tmp_path, analyzer):
+    log = tmp_path / "application.log"
+    entry = job_completed("1", 120)
+    cut = entry.index('"durationMs"')
+    log.write_text(job_started("1") + entry[:cut])
+
+    analyzer.update([str(log)])
+    assert run_stats(analyzer)["completed"] == 0
+
+    with open(log, "a") as f:
+        f.write(entry[cut:])
+    analyzer.update([str(log)])
+
+    stats = run_stats(analyzer)
+    assert (stats["requests"], stats["completed"]) == (1, 1)
+    assert stats["latency_max_ms"] == 120
+
+
+def test_partial_python_json_line_waits_for_newline(tmp_path, analyzer):
+    log = tmp_path / "python-service.log"
+    line = json.dumps({"timestamp": "2026-10-19 10:00:00", "operation": "http_response",
+                       "url": "/send_message", "statusCode": 200, "chatId": "c1", "duration": 42})
+    log.write_text(line[:20])
+
+    assert analyzer.update([str(log)])[0] == 0
+    with open(log, "a") as f:
+        f.write(line[20:] + "\n")
+    assert analyzer.update([str(log)])[0] == 1
+    assert analyzer.summary("channel")[0]["completed"] == 1
+
+
+@pytest.mark.parametrize("rotated_name", ["application1.log", "application.log.1"])
+def test_rotated_file_is_not_read_twice(tmp_path, analyzer, rotated_name):
+    log = tmp_path / "application.log"
+    log.write_text(job_started("1") + job_completed("1", 120))
+    analyzer.update([str(log)])
+
+    os.rename(log, tmp_path / rotated_name)
+    log.write_text(job_started("2") + job_completed("2", 80))
+    analyzer.update([str(log)])
+
+    assert rotation_family(str(log)) == [str(tmp_path / rotated_name), str(log)]
+    stats = run_stats(analyzer)
+    assert (stats["requests"], stats["completed"]) == (2, 2)
+
+
+def test_rotation_family_orders_oldest_first(tmp_path):
+    for name in ("application.log", "application1.log", "application2.log", "application.log.3"):
+        (tmp_path / name).write_text("x\n")
+
+    family = [os.path.basename(path) for path in rotation_family(str(tmp_path / "application.log"))]
+
+    assert family == ["application.log.3", "application2.log", "application1.log", "application.log"]
+
+
+def test_lock_logs_do_not_reset_pending_job(tmp_path, analyzer):
+    lock_failed = winston("2026-10-19 10:00:02", "Session lock acquisition failed",
+                          {"operation": "process_job", "jobId": "1", "sessionId": "s1",
+                           "error": "Session is locked by another process"}, level="WARN")
+    completed = winston("2026-10-19 10:00:05", "Worker job completed successfully",
+                        {"operation": "process_job", "jobId": "1", "runId": "r1", "chatId": "c1",
+                         "event": "job_completed"})
+    log = tmp_path / "application.log"
+    log.write_text(job_started("1") + lock_failed + completed)
+
+    analyzer.update([str(log)])
+
+    stats = run_stats(analyzer)
+    assert stats["requests"] == 1
+    # Latency comes from the pending start, which the lock log must not move
+    assert stats["latency_max_ms"] == 5000
+
+
+def test_warns_when_only_failures_are_logged(tmp_path, analyzer):
+    log = tmp_path / "application.log"
+    log.write_text(winston("2026-10-19 10:00:01", "Worker job attempt failed",
+                           {"operation": "process_job", "jobId": "1", "runId": "r1", "chatId": "c1",
+                            "statusCode": 500, "error": "boom", "event": "job_attempt_failed"}, level="WARN"))
+
+    analyzer.update([str(log)])
+
+    assert "info" in analyzer.missing_completions_warning()
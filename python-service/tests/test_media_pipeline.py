@@ -0,0 +1,205 @@
+import asyncio
+import itertools
+import os
+
+import pyrogram.session
+import pytest
+from pyrogram import errors, raw
+
+from media_pipeline import (BIG_FILE_THRESHOLD, PART_SIZE, MediaPipeline, MediaStore, MediaValidationError,
+                            _fingerprint)
+
+
+class PartFailed(Exception):
+    """Simulated connection loss while sending one part"""
+
+
+class FakeStorage:
+    async def dc_id(self):
+        return 4
+
+    async def auth_key(self):
+        return b'\x00' * 256
+
+    async def test_mode(self):
+        return False
+
+
+class FakeClient:
+    _ids = itertools.count(1000)
+
+    def __init__(self):
+        self.storage = FakeStorage()
+
+    def rnd_id(self):
+        return next(self._ids)
+
+
+class FakeSession:
+    """Stands in for pyrogram.session.Session; records every part sent"""
+
+    sent = []           # (file_id, part, big) per successful invoke
+    fail_parts = set()  # parts that raise PartFailed
+    flood_once = set()  # parts that raise FloodWait(0) on their first attempt
+    total_parts = 0
+    started = 0
+    stopped = 0
+
+    def __init__(self, client, dc_id, auth_key, test_mode, is_media=False):
+        assert is_media
+
+    async def start(self):
+        FakeSession.started += 1
+
+    async def stop(self):
+        FakeSession.stopped += 1
+
+    async def invoke(self, rpc):
+        if rpc.file_part in FakeSession.fail_parts:
+            raise PartFailed(rpc.file_part)
+        if rpc.file_part in FakeSession.flood_once:
+            FakeSession.flood_once.discard(rpc.file_part)
+            raise errors.FloodWait(value=0)
+        big = isinstance(rpc, raw.functions.upload.SaveBigFilePart)
+        if big:
+            assert rpc.file_total_parts == FakeSession.total_parts
+        FakeSession.sent.append((rpc.file_id, rpc.file_part, big))
+        return True
+
+
+@pytest.fixture
+def session(monkeypatch):
+    FakeSession.sent = []
+    FakeSession.fail_parts = set()
+    FakeSession.flood_once = set()
+    FakeSession.started = FakeSession.stopped = 0
+    monkeypatch.setattr(pyrogram.session, 'Session', FakeSession)
+    return FakeSession
+
+
+@pytest.fixture
+def pipeline(tmp_path):
+    return MediaPipeline(store=MediaStore(tmp_path / 'cache'), workers=4, resume_ttl=3600)
+
+
+def make_file(tmp_path, size, name='clip.mp4', fill=b'a'):
+    path = tmp_path / name
+    path.write_bytes(fill * size)
+    return str(path)
+
+
+def upload(pipeline, path, owner='session1'):
+    return asyncio.run(pipeline.upload(FakeClient(), {'path': path}, owner))
+
+
+def stored_state(pipeline, path, owner='session1'):
+    key = f"{owner}:{_fingerprint(path, os.stat(path))}"
+    return pipeline.store.get_upload(key, 3600)
+
+
+@pytest.mark.parametrize('parts, big', [(6, False), (21, True)])
+def test_resume_sends_only_missing_parts_with_same_file_id(tmp_path, pipeline, session, parts, big):
+    path = make_file(tmp_path, (parts - 1) * PART_SIZE + 1000)
+    assert (os.path.getsize(path) > BIG_FILE_THRESHOLD) == big
+    session.total_parts = parts
+    session.fail_parts = {3}
+
+    with pytest.raises(PartFailed):
+        upload(pipeline, path)
+
+    first_file_id = session.sent[0][0]
+    sent_first = {part for _, part, _ in session.sent}
+    assert 3 not in sent_first
+    file_id, total_parts, done = stored_state(pipeline, path)
+    assert (file_id, total_parts) == (first_file_id, parts)
+    assert {part for part in range(parts) if done[part]} == sent_first
+
+    session.sent = []
+    session.fail_parts = set()
+    result = upload(pipeline, path)
+
+    resent = {part for _, part, _ in session.sent}
+    assert resent == set(range(parts)) - sent_first
+    assert {file_id for file_id, _, _ in session.sent} == {first_file_id}
+    assert all(sent_big == big for _, _, sent_big in session.sent)
+    assert isinstance(result, raw.types.InputFileBig if big else raw.types.InputFile)
+    assert (result.id, result.parts) == (first_file_id, parts)
+    assert stored_state(pipeline, path) is None
+    assert session.started == session.stopped == 2
+
+
+def test_replaced_file_with_same_size_starts_over(tmp_path, pipeline, session):
+    path = make_file(tmp_path, 5 * PART_SIZE)
+    session.total_parts = 5
+    session.fail_parts = {2}
+    with pytest.raises(PartFailed):
+        upload(pipeline, path)
+    first_file_id = session.sent[0][0]
+
+    make_file(tmp_path, 5 * PART_SIZE, fill=b'b')
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    session.sent = []
+    session.fail_parts = set()
+    result = upload(pipeline, path)
+
+    assert sorted(part for _, part, _ in session.sent) == list(range(5))
+    assert result.id != first_file_id
+
+
+def test_flood_wait_on_a_part_is_retried(tmp_path, pipeline, session):
+    path = make_file(tmp_path, 3 * PART_SIZE)
+    session.total_parts = 3
+    session.flood_once = {1}
+
+    result = upload(pipeline, path)
+
+    assert sorted(part for _, part, _ in session.sent) == [0, 1, 2]
+    assert result.parts == 3
+
+
+def test_uploads_are_kept_apart_per_session(tmp_path, pipeline, session):
+    path = make_file(tmp_path, 3 * PART_SIZE)
+    session.total_parts = 3
+    session.fail_parts = {1}
+    with pytest.raises(PartFailed):
+        upload(pipeline, path, owner='session1')
+
+    assert stored_state(pipeline, path, owner='session2') is None
+
+
+def test_probe_rejects_empty_file(tmp_path, pipeline):
+    path = make_file(tmp_path, 0)
+
+    with pytest.raises(MediaValidationError, match="empty"):
+        pipeline.probe(path, 'video')
+
+
+def test_probe_rejects_missing_file(tmp_path, pipeline):
+    with pytest.raises(MediaValidationError, match="not accessible"):
+        pipeline.probe(str(tmp_path / 'missing.mp4'), 'video')
+
+
+def test_probe_rejects_oversized_video(tmp_path):
+    pipeline = MediaPipeline(store=MediaStore(tmp_path / 'cache'), max_video_bytes=1024)
+    path = make_file(tmp_path, 2048)
+
+    with pytest.raises(MediaValidationError, match="limit"):
+        pipeline.probe(path, 'video')
+
+
+@pytest.mark.parametrize('name, message_type', [('clip.txt', 'video'), ('image.bmp', 'photo')])
+def test_probe_rejects_wrong_extension(tmp_path, pipeline, name, message_type):
+    path = make_file(tmp_path, 100, name=name)
+
+    with pytest.raises(MediaValidationError, match="Unsupported"):
+        pipeline.probe(path, message_type)
+
+
+def test_probe_accepts_photo_and_caches_it(tmp_path, pipeline):
+    path = make_file(tmp_path, 100, name='image.jpg')
+
+    info = pipeline.probe(path, 'photo')
+
+    assert (info['kind'], info['size'], info['mime_type']) == ('photo', 100, 'image/jpeg')
+    assert pipeline.probe(path, 'photo') == info
@@ -0,0 +1,107 @@
+import asyncio
+import random
+
+import pytest
+from pyrogram import raw
+
+import bench_message_records as bench
+from message_records import iter_history, iter_replies, normalize_text
+
+
+def mixed_history_page():
+    """A text post, a video post with a caption, a service message and an empty (deleted) slot"""
+    peer = raw.types.PeerChannel(channel_id=bench.CHANNEL_ID)
+    replies = raw.types.MessageReplies(replies=3, replies_pts=1, comments=True, channel_id=bench.DISCUSSION_ID)
+    messages = [
+        raw.types.Message(id=104, peer_id=peer, date=1760000004, message='  Plain TEXT post ', post=True,
+                          replies=replies),
+        raw.types.Message(id=103, peer_id=peer, date=1760000003, message='Video CAPTION', post=True,
+                          media=bench._video(), replies=replies),
+        raw.types.MessageService(id=102, peer_id=peer, date=1760000002,
+                                 action=raw.types.MessageActionChannelCreate(title='Channel')),
+        raw.types.MessageEmpty(id=101),
+    ]
+    return raw.types.messages.ChannelMessages(
+        pts=1, count=len(messages), messages=messages, topics=[], chats=[bench._channel(bench.CHANNEL_ID, True)],
+        users=[])
+
+
+def replies_page_with_caption_duplicate(post_id):
+    """Comments where the duplicate is the caption of a video comment"""
+    page = bench.replies_page(post_id, 5)
+    page.messages[-1].message = bench._text(20)
+    page.messages[2].media = bench._video()
+    page.messages[2].message = f"{bench._text(10)} {bench.NEEDLE.upper()} {bench._text(10)}"
+    return page
+
+
+@pytest.fixture
+def loop():
+    loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(loop)
+    yield loop
+    loop.run_until_complete(loop.shutdown_asyncgens())
+    loop.close()
+    asyncio.set_event_loop(None)
+
+
+@pytest.fixture
+def client(loop):
+    random.seed(7)
+    history = mixed_history_page()
+    return bench.BenchClient(history, replies_page_with_caption_duplicate(history.messages[0].id))
+
+
+def collect(loop, make_iterator):
+    # BenchClient answers every page request with the same page, so callers ask for exactly one page
+    async def _collect():
+        return [item async for item in make_iterator()]
+    return loop.run_until_complete(_collect())
+
+
+def test_history_records_match_parsed_messages(loop, client):
+    records = collect(loop, lambda: iter_history(client, 'bench_channel', 4))
+    messages = collect(loop, lambda: client.get_chat_history(chat_id='bench_channel', limit=4))
+
+    assert [record.id for record, _ in records] == [message.id for message in messages] == [104, 103, 102, 101]
+    for (record, normalized), message in zip(records, messages):
+        if message.empty:
+            assert (record.chat_id, record.date_isoformat(), normalized) == (None, None, '')
+            continue
+        assert record.chat_id == message.chat.id
+        assert record.date_isoformat() == message.date.isoformat()
+        assert normalized == normalize_text(message.text if message.text else message.caption)
+
+    normalized = [text for _, text in records]
+    assert normalized == ['plain text post', 'video caption', '', '']
+    assert [record.reply_count for record, _ in records] == [3, 3, 0, 0]
+
+
+def test_reply_records_match_parsed_messages(loop, client):
+    records = collect(loop, lambda: iter_replies(client, 'bench_channel', 104, 5))
+    comments = collect(loop, lambda: client.get_discussion_replies(
+        chat_id='bench_channel', message_id=104, limit=5))
+
+    assert [record.id for record, _ in records] == [comment.id for comment in comments]
+    for (record, normalized), comment in zip(records, comments):
+        assert record.chat_id == comment.chat.id
+        assert record.date_isoformat() == comment.date.isoformat()
+        assert normalized == normalize_text(comment.text if comment.text else comment.caption)
+    assert comments[2].caption and not comments[2].text
+
+
+def test_duplicate_in_a_caption_is_found_like_the_old_check(loop, client):
+    before = loop.run_until_complete(bench.scan_before(client, 'bench_channel', bench.NEEDLE))
+    after = loop.run_until_complete(bench.scan_after(client, 'bench_channel', bench.NEEDLE))
+
+    assert before is not None and after is not None
+    assert after.id == before.id == 50002
+    assert after.chat_id == before.chat.id
+    assert after.date_isoformat() == before.date.isoformat()
+
+
+def test_no_duplicate_is_found_like_the_old_check(loop, client):
+    before = loop.run_until_complete(bench.scan_before(client, 'bench_channel', 'not posted anywhere'))
+    after = loop.run_until_complete(bench.scan_after(client, 'bench_channel', 'not posted anywhere'))
+
+    assert before is None and after is None
@@ -0,0 +1,92 @@
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+from telegram_trace import TraceRecorder, load_traces
+
+
+class FakeMessage:
+    def __init__(self, message_id, text=None, caption=None, chat_id=-1001500000001):
+        self.id = message_id
+        self.date = datetime(2026, 10, 1, 12, 0, message_id % 60)
+        self.text = text
+        self.caption = caption
+        self.chat = SimpleNamespace(id=chat_id)
+
+    async def reply(self, text, **kwargs):
+        return FakeMessage(self.id + 1000, text=text)
+
+
+class FakeClient:
+    """Offline stand-in for pyrogram.Client, wrapped by the recorder like the real one"""
+
+    def __init__(self, name, session_string=None):
+        pass
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def get_me(self):
+        return SimpleNamespace(id=42, first_name='Ada', last_name=None, username='ada',
+                               phone_number=None, is_premium=False)
+
+    async def get_chat_history(self, chat_id, limit=0):
+        for message_id in (300, 299):
+            yield FakeMessage(message_id, caption=f"post {message_id}")
+
+    async def get_discussion_replies(self, chat_id, message_id, limit=0):
+        yield FakeMessage(message_id + 1, text="an older comment")
+
+    async def get_discussion_message(self, chat_id, message_id):
+        return FakeMessage(message_id)
+
+
+def record(service_app, monkeypatch, path):
+    monkeypatch.setattr(service_app, 'Client', FakeClient)
+    monkeypatch.setattr(service_app, 'trace_recorder', TraceRecorder(str(path)))
+    client = service_app.app.test_client()
+    sent = client.post('/send_message', json={
+        'session_string': 'recorded-session', 'chat_id': '@channel', 'message_type': 'text', 'caption': 'new comment'})
+    me = client.post('/get_me', json={'session_string': 'recorded-session'})
+    monkeypatch.setattr(service_app, 'trace_recorder', None)
+    return sent, me
+
+
+def test_recorded_traces_replay_with_the_same_status(service_app, monkeypatch, tmp_path):
+    import replay_traces
+
+    path = tmp_path / 'traces.jsonl'
+    sent, me = record(service_app, monkeypatch, path)
+    assert sent.status_code == me.status_code == 200
+    assert sent.get_json()['skipped'] is False
+    assert [trace['endpoint'] for trace in load_traces(str(path))] == ['/send_message', '/get_me']
+
+    # Replay must not need a real client at all
+    monkeypatch.setattr(service_app, 'Client', None)
+    summary = replay_traces.run_replay(str(path), speed=0)
+
+    assert summary['requests'] == 2
+    assert summary['failed'] == 0
+    assert summary['unmatched_calls'] == 0
+    for endpoint in ('/send_message', '/get_me'):
+        stats = summary['endpoints'][endpoint]
+        assert stats['status'] == {'200': 1}
+        assert stats['status_changed'] == 0
+
+
+def test_failed_replays_are_counted(service_app, monkeypatch, tmp_path):
+    import replay_traces
+
+    path = tmp_path / 'traces.jsonl'
+    record(service_app, monkeypatch, path)
+    with open(path, 'a', encoding='utf-8') as f:
+        f.write(json.dumps({'started_at': 0, 'calls': []}) + '\n')  # no endpoint: replay_one raises
+
+    summary = replay_traces.run_replay(str(path), speed=0)
+
+    assert summary['requests'] == 2
+    assert summary['failed'] == 1
+    assert summary['failures'][0]['error'].startswith('KeyError')
@@ -0,0 +1,79 @@
+import pytest
+from pyrogram import errors, raw
+
+from admission import session_key
+
+
+class FakeMessage:
+    id = 1
+
+    async def reply(self, text):
+        return self
+
+
+class FakeClient:
+    """Just enough of pyrogram.Client for send_message to reach the history scan"""
+
+    def __init__(self, start_error=None, resolve_error=None):
+        self.start_error = start_error
+        self.resolve_error = resolve_error
+
+    async def start(self):
+        if self.start_error:
+            raise self.start_error
+
+    async def stop(self):
+        pass
+
+    async def get_discussion_replies(self, chat_id, message_id, limit=0):
+        # The channel-list post send_message keeps up to date: no comments yet
+        return
+        yield
+
+    async def get_discussion_message(self, chat_id, message_id):
+        return FakeMessage()
+
+    async def resolve_peer(self, peer_id):
+        if self.resolve_error:
+            raise self.resolve_error
+        return raw.types.InputPeerChannel(channel_id=1500000001, access_hash=0)
+
+    async def invoke(self, query, *args, **kwargs):
+        # An empty channel: nothing to comment on
+        return raw.types.messages.ChannelMessages(pts=1, count=0, messages=[], topics=[], chats=[], users=[])
+
+
+def send(service_app, monkeypatch, session_string, client):
+    monkeypatch.setattr(service_app, 'make_client', lambda name, session: client)
+    return service_app.app.test_client().post('/send_message', json={
+        'session_string': session_string, 'chat_id': '@channel', 'message_type': 'text', 'caption': 'hi'})
+
+
+def success_rate(service_app, session_string):
+    return service_app.account_health.snapshot().get(session_key(session_string), {}).get('success_rate')
+
+
+@pytest.mark.parametrize('client', [
+    FakeClient(resolve_error=errors.UsernameNotOccupied()),
+    FakeClient(),
+], ids=['username_not_occupied', 'no_suitable_message'])
+def test_channel_failures_do_not_count_against_the_account(service_app, monkeypatch, client):
+    session_string = f"channel-failure-{id(client)}"
+
+    for _ in range(3):
+        response = send(service_app, monkeypatch, session_string, client)
+        assert response.get_json()['success'] is False
+
+    assert success_rate(service_app, session_string) is None
+    assert service_app.account_health.weight(session_key(session_string))[0] == 1.0
+
+
+@pytest.mark.parametrize('error', [errors.AuthKeyUnregistered(), ConnectionResetError()],
+                         ids=['auth_key_unregistered', 'connection_reset'])
+def test_account_failures_count_against_the_account(service_app, monkeypatch, error):
+    session_string = f"account-failure-{type(error).__name__}"
+
+    response = send(service_app, monkeypatch, session_string, FakeClient(start_error=error))
+
+    assert response.status_code == 500
+    assert success_rate(service_app, session_string) < 1.0
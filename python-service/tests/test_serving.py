@@ -0,0 +1,84 @@
+import os
+import socket
+import threading
+
+import pytest
+from flask import Flask
+
+from serving import bind_unix_socket, create_unix_server
+
+
+@pytest.fixture
+def socket_path(tmp_path):
+    # AF_UNIX paths are limited to ~100 bytes, pytest's tmp_path can be longer
+    path = f"/tmp/python-service-test-{os.getpid()}-{id(tmp_path)}.sock"
+    yield path
+    if os.path.exists(path):
+        os.unlink(path)
+
+
+def read_response(conn):
+    """Read one HTTP response (headers + Content-Length body) from a raw socket"""
+    data = b''
+    while b'\r\n\r\n' not in data:
+        chunk = conn.recv(4096)
+        if not chunk:
+            raise ConnectionError("connection closed before headers")
+        data += chunk
+    head, body = data.split(b'\r\n\r\n', 1)
+    headers = dict(line.split(': ', 1) for line in head.decode().split('\r\n')[1:])
+    while len(body) < int(headers['Content-Length']):
+        body += conn.recv(4096)
+    return head.decode().split('\r\n')[0], headers, body
+
+
+def test_two_requests_over_one_unix_socket_connection(socket_path):
+    app = Flask(__name__)
+
+    @app.route('/health')
+    def health():
+        return {'status': 'OK'}
+
+    server = create_unix_server(app, socket_path, threads=2)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    try:
+        conn = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        conn.settimeout(5)
+        conn.connect(socket_path)
+        for _ in range(2):
+            conn.sendall(b'GET /health HTTP/1.1\r\nHost: localhost\r\n\r\n')
+            status, headers, body = read_response(conn)
+            assert status == 'HTTP/1.1 200 OK'
+            assert headers.get('Connection', '').lower() != 'close'
+            assert b'OK' in body
+        conn.close()
+    finally:
+        server.close()
+
+
+def test_refuses_to_replace_regular_file(socket_path):
+    with open(socket_path, 'w') as f:
+        f.write('not a socket')
+
+    with pytest.raises(RuntimeError, match="not a socket"):
+        bind_unix_socket(socket_path)
+    assert open(socket_path).read() == 'not a socket'
+
+
+def test_replaces_stale_socket(socket_path):
+    stale = bind_unix_socket(socket_path)
+    stale.close()  # file remains, nobody listening
+
+    sock = bind_unix_socket(socket_path)
+    sock.close()
+
+
+def test_refuses_socket_in_use(socket_path):
+    live = bind_unix_socket(socket_path)
+    live.listen(1)
+    try:
+        with pytest.raises(RuntimeError, match="in use"):
+            bind_unix_socket(socket_path)
+    finally:
+        live.close()
@@ -0,0 +1,73 @@
+import pytest
+
+from session_registry import SessionRegistry, UnknownSessionHandle
+
+
+def test_handle_is_deterministic_and_does_not_contain_the_session():
+    handle = SessionRegistry.handle_for("secret-session")
+
+    assert handle == SessionRegistry.handle_for("secret-session")
+    assert handle.startswith("sh_") and len(handle) == 27
+    assert "secret" not in handle
+
+
+def test_register_and_resolve():
+    registry = SessionRegistry()
+    handle = registry.register("s1")
+
+    assert registry.resolve(handle) == "s1"
+    assert registry.register("s1") == handle
+    assert len(registry) == 1
+
+
+def test_unknown_handle_raises_key_error_subclass():
+    registry = SessionRegistry()
+
+    with pytest.raises(UnknownSessionHandle):
+        registry.resolve("sh_missing")
+    with pytest.raises(KeyError):
+        registry.resolve("sh_missing")
+
+
+def test_evicts_least_recently_used():
+    registry = SessionRegistry(max_sessions=2)
+    first = registry.register("s1")
+    second = registry.register("s2")
+    registry.resolve(first)  # s2 is now the least recently used
+
+    third = registry.register("s3")
+
+    assert registry.resolve(first) == "s1"
+    assert registry.resolve(third) == "s3"
+    with pytest.raises(UnknownSessionHandle):
+        registry.resolve(second)
+
+
+def test_unregister():
+    registry = SessionRegistry()
+    handle = registry.register("s1")
+
+    assert registry.unregister(handle) is True
+    assert registry.unregister(handle) is False
+    with pytest.raises(UnknownSessionHandle):
+        registry.resolve(handle)
+
+
+def test_unknown_handle_gets_404_and_re_registering_restores_it(service_app):
+    client = service_app.app.test_client()
+    handle = SessionRegistry.handle_for("expired-session")
+    service_app.session_registry.unregister(handle)
+
+    response = client.post('/plan_assignments', json={
+        'sessions': [{'id': 's1', 'session_handle': handle}], 'targets': ['-1001']})
+    assert response.status_code == 404
+    assert response.get_json()['error_code'] == 'unknown_session_handle'
+
+    # What backend/utils/pythonClient.js does on that 404: register again, retry with the new handle
+    registered = client.post('/sessions/register', json={'session_string': 'expired-session'}).get_json()
+    assert registered['session_handle'] == handle
+
+    response = client.post('/plan_assignments', json={
+        'sessions': [{'id': 's1', 'session_handle': handle}], 'targets': ['-1001']})
+    assert response.status_code == 200
+    assert response.get_json()['assignments'] == {'-1001': 's1'}